@@ -1,11 +1,20 @@
 create database if not exists corona;
 use corona;
 create table locations (
+	location_id int auto_increment primary key,
+
 	/* Administrative division location */
 	country varchar(256) default '',
 	province varchar(256) default '',
 	county varchar(256) default '',
 
+	/* Set on the aggregate rows of continents, which have no country */
+	`group` varchar(320) default '',
+
+	/* Alternate keys */
+	country_code char(2),
+	fips varchar(5),
+
 	population float,
 	population_density float,
 
@@ -14,13 +23,17 @@ create table locations (
 
 	start_cases date,
 
-	primary key (country, province, county)
+	unique key location_names (country, province, county, `group`),
+	unique key (fips),
+	key (country_code)
 
 ) collate utf8_bin;
 
-create table datapoints (
+/* Recent months, written by the collector. See data_collection/partitioning.py */
+create table datapoints_live (
+	location_id int not null,
 	entry_date varchar(16),
-	update_time datetime not null default CURRENT_TIMESTAMP,
+	update_time datetime not null default CURRENT_TIMESTAMP on update CURRENT_TIMESTAMP,
 	
 	country varchar(320) default '',
 	province varchar(320) default '',
@@ -41,11 +54,103 @@ create table datapoints (
 	-- source_tests TEXT,
 	-- source_hospitalized TEXT,
 
-	PRIMARY KEY(country, province, county, entry_date)
-) COLLATE utf8_bin;
+	/* The key is location_id, but readers still look datapoints up by name */
+	PRIMARY KEY(location_id, entry_date),
+	key location_names (country, province, county, entry_date),
+	key (update_time)
+) COLLATE utf8_bin
+partition by range columns(entry_date) (
+	partition p2020_01 values less than ('2020-02-01'),
+	partition pmax values less than (MAXVALUE)
+);
+
+/* Months that are no longer collected */
+create table datapoints_archive like datapoints_live;
+alter table datapoints_archive row_format=compressed remove partitioning;
+
+/* What readers query: live rows take precedence over archived ones. Continent rows are left out */
+create view datapoints as
+	select * from datapoints_live where not (country = '' and ifnull(`group`, '') <> '')
+	union all
+	select * from datapoints_archive archived where not (country = '' and ifnull(`group`, '') <> '') and not exists (
+		select 1 from datapoints_live live where
+			live.location_id = archived.location_id and
+			live.entry_date = archived.entry_date
+	);
+
+/* Continent totals, one row per continent per day */
+create view group_datapoints as
+	select * from datapoints_live where country = '' and ifnull(`group`, '') <> ''
+	union all
+	select * from datapoints_archive archived where country = '' and ifnull(`group`, '') <> '' and not exists (
+		select 1 from datapoints_live live where
+			live.location_id = archived.location_id and
+			live.entry_date = archived.entry_date
+	);
+
+/* Runs of days with unchanged stats, used instead of datapoints_live in interval storage mode */
+create table datapoint_intervals (
+	location_id int not null,
+	valid_from varchar(16),
+	valid_to varchar(16),
+	update_time datetime not null default CURRENT_TIMESTAMP on update CURRENT_TIMESTAMP,
+
+	total integer default 0,
+	recovered integer default 0,
+	deaths integer default 0,
+	serious integer default 0,
+	tests integer default 0,
+	hospitalized integer default 0,
+
+	PRIMARY KEY(location_id, valid_from),
+	key (valid_to),
+	key (update_time)
+);
+
+/*
+One row per day, for expanding intervals into days. With DATAPOINT_STORAGE=intervals,
+`python partitioning.py --install` fills this and replaces the datapoints and
+group_datapoints views with ones over datapoint_intervals joined to calendar_days
+*/
+create table calendar_days (
+	entry_date varchar(16) not null,
+	PRIMARY KEY(entry_date)
+);
+
+/* Per-location summaries of each week (starting Monday) and month. See data_collection/rollups.py */
+create table weekly_rollups (
+	location_id int not null,
+	period_start varchar(16),
+	period_end varchar(16),
+	last_date varchar(16),
+
+	total integer default 0,
+	recovered integer default 0,
+	deaths integer default 0,
+	serious integer default 0,
+	tests integer default 0,
+	hospitalized integer default 0,
+
+	dtotal integer default 0,
+	drecovered integer default 0,
+	ddeaths integer default 0,
+	dtests integer default 0,
+
+	avg_dtotal float,
+	avg_drecovered float,
+	avg_ddeaths float,
+	avg_dtests float,
+
+	update_time datetime,
+
+	PRIMARY KEY(location_id, period_start)
+);
+
+create table monthly_rollups like weekly_rollups;
 
 create table hospitals (
 	hospital_id int auto_increment primary key,
+	source_id varchar(64) unique,
 	hospital_name varchar(256),
 	hospital_type varchar(256),
 	`address1` varchar(256),
@@ -59,5 +164,69 @@ create table hospitals (
 	adult_icu_beds int default 0,
 	pediatric_icu_beds int default 0,
 	potential_beds_increase int default 0,
-	average_ventilator_usage int default 0
+	average_ventilator_usage int default 0,
+
+	latitude float(10, 6),
+	longitude float(10, 6),
+	grid_cell int,
+
+	key (grid_cell)
+);
+
+/* Hospital capacity within radius_km of each location. See data_imports/import_hospitals.py */
+create table location_capacity (
+	location_id int primary key,
+	radius_km float,
+	hospitals int default 0,
+	licensed_beds int default 0,
+	staffed_beds int default 0,
+	icu_beds int default 0,
+	adult_icu_beds int default 0,
+	pediatric_icu_beds int default 0,
+	update_time datetime
+);
+
+/* When each location last changed, and when a source last reported it. See data_collection/freshness.py */
+create table location_freshness (
+	location_id int primary key,
+	last_changed datetime,
+	last_seen datetime,
+	source varchar(256),
+
+	key (last_changed),
+	key (last_seen)
+);
+
+/* Daily community mobility, as a percent change from the baseline. See data_collection/data_imports/import_mobility.py */
+create table mobility (
+	location_id int,
+	entry_date varchar(16),
+	retail_change float,
+	grocery_change float,
+	parks_change float,
+	transit_change float,
+	workplaces_change float,
+	residential_change float,
+	update_time datetime,
+	primary key (location_id, entry_date)
+);
+
+/* Unseen location names that were matched to known ones, or nearly were. See data_collection/location_resolver.py */
+create table location_matches (
+	match_id int auto_increment primary key,
+	country varchar(256) default '',
+	province varchar(256) default '',
+	county varchar(256) default '',
+	level int,
+	matched_name varchar(256),
+	score float,
+	accepted boolean,
+	match_time datetime
+);
+
+/* The latest entry_date each incremental source has fully imported. See data_collection/watermarks.py */
+create table source_watermarks (
+	source varchar(256) primary key,
+	entry_date varchar(16),
+	update_time datetime
 );
@@ -1,26 +1,41 @@
-from corona_sql import Session, Datapoint, Location
-from sqlalchemy import or_, between, func
+from corona_sql import Session, Datapoint, Location, datapoints_archive, location_index
+from sqlalchemy import and_, or_, between, func
 from datetime import date, datetime
 
 import recounting
 
 class DatapointCache(dict):
-    def __init__(self, datapoints, session, force_update=False):
+    def __init__(self, datapoints, session, force_update=False, archived=()):
         for datapoint in datapoints:
             self.add(datapoint)
 
+        # rows of archived months, which are only written back to the live table if they change
+        self.archived = set()
+        for datapoint in archived:
+            self.add(datapoint)
+            self.archived.add(datapoint.key)
+
         self.session = session
         self.force_update = force_update
         self.seen = set()
         self.was_updated = False
         self.potential_changes = set()
+        # (location_id, entry_date) of every datapoint whose stats changed
+        self.changed = set()
     
     def add(self, datapoint: Datapoint):
-        self[datapoint.t] = datapoint
+        self[datapoint.key] = datapoint
+
+    def parents(self, datapoint: Datapoint):
+        entry_date = datapoint.date_str()
+        for location_id in location_index.ancestor_ids(self.session, datapoint.location_id):
+            yield location_id, entry_date
 
     def recount_changes(self):
-        for country, province, county, entry_date in sorted(self.potential_changes, reverse=True):
-            overall = recounting.sum_children(country, province, county, entry_date, self.session)
+        # deeper locations are recounted first, so their parents see the new sums
+        by_depth = lambda change: (location_index.depth(change[0]), change[1])
+        for location_id, entry_date in sorted(self.potential_changes, key=by_depth, reverse=True):
+            overall = recounting.sum_children(location_id, entry_date, self.session)
             if overall:
                 self.update_data(overall)
 
@@ -43,7 +58,7 @@ class DatapointCache(dict):
             else:
                 return d
 
-        t = datapoint_data['country'], datapoint_data['province'], datapoint_data['county'], iso(datapoint_data['entry_date'])
+        t = datapoint_data['location_id'], iso(datapoint_data['entry_date'])
         
         if t in self.seen:
             return self[t], False
@@ -51,27 +66,34 @@ class DatapointCache(dict):
             self.seen.add(t)
 
         if t in self:
-            if self[t].update(datapoint_data, requireIncreasing=not self.force_update) or self.force_update:
-                self.potential_changes.update(self[t].parents())
+            changed = self[t].update(datapoint_data, requireIncreasing=not self.force_update)
+            if changed:
+                self.changed.add(t)
+                if t in self.archived:
+                    # live rows take priority over the archive, so the whole row moves back
+                    self.session.add(self[t])
+                    self.archived.discard(t)
+
+            if changed or self.force_update:
+                self.potential_changes.update(self.parents(self[t]))
                 self.was_updated = True
         else:
             datapoint = Datapoint(datapoint_data)
             self.session.add(datapoint)
             self[t] = datapoint
             
-            self.potential_changes.update(datapoint.parents())
+            self.changed.add(t)
+            self.potential_changes.update(self.parents(datapoint))
             self.was_updated = True
 
     @staticmethod
     def create(rows, session):
-        countries = {''}
-        provinces = {''}
+        location_ids = set()
 
         max_entry_date = min_entry_date = rows[0]['entry_date']
 
         for row in rows:
-            countries.add(row['country'])
-            provinces.add(row['province'])
+            location_ids.add(row['location_id'])
 
             row_date = row['entry_date']
             if row_date < min_entry_date:
@@ -79,15 +101,25 @@ class DatapointCache(dict):
             if row_date > max_entry_date:
                 max_entry_date = row_date
 
-        datapoints = session.query(Datapoint).filter(Datapoint.entry_date.between(min_entry_date, max_entry_date))
-        
-        if len(countries) <= 2:
-            datapoints = datapoints.filter(Datapoint.country.in_(countries))
+        # the parents are loaded too, because recounting updates them
+        for location_id in list(location_ids):
+            location_ids.update(location_index.ancestor_ids(session, location_id))
 
-        if len(provinces) <= 2:
-            datapoints = datapoints.filter(Datapoint.province.in_(provinces))
+        def in_range(table):
+            condition = table.c.entry_date.between(min_entry_date, max_entry_date)
+            if len(location_ids) <= 1000:
+                condition = and_(condition, table.c.location_id.in_(list(location_ids)))
+            return condition
+
+        datapoints = session.query(Datapoint).filter(in_range(Datapoint.__table__))
+
+        # rows that are only in the archive (a re-imported old month) are loaded from there
+        live = Datapoint.__table__
+        in_live = session.query(live).filter(live.c.location_id == datapoints_archive.c.location_id, live.c.entry_date == datapoints_archive.c.entry_date).exists()
+        archived_rows = session.query(datapoints_archive).filter(in_range(datapoints_archive), ~in_live)
+        archived = [Datapoint(dict(row.items())) for row in session.execute(archived_rows.statement)]
 
-        return DatapointCache(datapoints, session)
+        return DatapointCache(datapoints, session, archived=archived)
 
 class LocationCache(dict):
     def __init__(self, locations, session):
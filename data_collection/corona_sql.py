@@ -1,21 +1,75 @@
 from sqlalchemy import or_
-from sqlalchemy import create_engine, Column, Integer, Float, Boolean, String, DateTime, Enum, Date, JSON
+from sqlalchemy import create_engine, Column, Integer, Float, Boolean, String, DateTime, Enum, Date, JSON, Table, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.sql import func
 
 import os
+import time
+from collections import defaultdict
 from datetime import date, datetime, timedelta
 from decimal import Decimal
 
+import standards
+import location_resolver
+
 silent_mode = False
 
+# Store datapoints as runs of unchanged days (intervals.py) instead of a row per day.
+# This is set per database (DATAPOINT_STORAGE=intervals), since readers only see one of the two stores
+interval_storage = os.environ.get('DATAPOINT_STORAGE', 'daily') == 'intervals'
+
+# Match unseen location names to close variants of known ones (location_resolver.py) instead of adding duplicates
+resolve_location_names = True
+
 # Keep the actual SQL URL private
 sql_uri = os.environ['DATABASE_URL']
 engine = create_engine(sql_uri, encoding='utf-8', pool_pre_ping=True)
 
+# Read-only work can go to a replica. Without one, it goes to the primary
+read_sql_uri = os.environ.get('DATABASE_READ_URL')
+read_engine = create_engine(read_sql_uri, encoding='utf-8', pool_pre_ping=True) if read_sql_uri else engine
+
+# Replicas that are further behind than this (in seconds) aren't read from
+max_replica_lag = int(os.environ.get('DATABASE_MAX_REPLICA_LAG', '60'))
+
 # Scoped_session is important here
 Session = scoped_session(sessionmaker(bind=engine, autocommit=False))
+ReadSession = scoped_session(sessionmaker(bind=read_engine, autocommit=False))
+
+_replica_lag = None
+_replica_lag_checked = 0
+
+def replica_lag():
+	"""Seconds that the replica is behind the primary, or None if it can't be measured"""
+	global _replica_lag, _replica_lag_checked
+
+	if read_engine is engine:
+		return 0
+
+	# only check every few seconds, so this isn't a query per read
+	if time.time() - _replica_lag_checked > 10:
+		_replica_lag_checked = time.time()
+		try:
+			with read_engine.connect() as conn:
+				status = conn.execute("SHOW SLAVE STATUS").first()
+			_replica_lag = status['Seconds_Behind_Master'] if status else None
+		except Exception:
+			_replica_lag = None
+
+	return _replica_lag
+
+def use_replica(fresh=False):
+	"""Whether reads can go to the replica: it's caught up, and its lag could be measured"""
+	if fresh:
+		return False
+
+	lag = replica_lag()
+	return lag is not None and lag <= max_replica_lag
+
+def read_session(fresh=False):
+	"""A session for read-only work. Pass fresh=True if the data has to be up to date with the last write"""
+	return ReadSession() if use_replica(fresh) else Session()
 
 # Class used to make tables
 Base = declarative_base()
@@ -25,13 +79,27 @@ increase_labels = {'total', 'deaths', 'recovered', 'tests'}
 
 class Location(Base):
 	__tablename__ = "locations"
+	__table_args__ = (UniqueConstraint('country', 'province', 'county', 'group', name='location_names'),)
+
+	location_id = Column(Integer, primary_key=True)
 
-	country = Column(String(256), primary_key=True)
-	province = Column(String(256), primary_key=True)
-	county = Column(String(256), primary_key=True)
+	country = Column(String(256), default='')
+	province = Column(String(256), default='')
+	county = Column(String(256), default='')
+
+	# set on the aggregate rows of named groups (continents), which have no country
+	group = Column(String(320), default='')
+
+	# alternate keys
+	country_code = Column(String(2), index=True)
+	fips = Column(String(5), unique=True)
 
 	latitude = Column(Float(10, 6))
 	longitude = Column(Float(10, 6))
+
+	# thousands of people, and thousands of people per km². See data_imports/import_population.py
+	population = Column(Float)
+	population_density = Column(Float)
 	
 	@property
 	def location_labelled(self):
@@ -71,23 +139,8 @@ class Location(Base):
 		else:
 			return f"<Location {self.combined_key}>"
 
-class Datapoint(Base):
-	__tablename__ = "datapoints"
-
-	def __init__(self, data):
-		super().__init__(**data)
-
-	# columns about the date/time of the datapoint
-	entry_date = Column(String(16), primary_key=True)
-	update_time = Column(DateTime, default=datetime.utcnow())
-	
-	# columns about the nominal location
-	county = Column(String(320), default='', primary_key=True)
-	province = Column(String(320), default='', primary_key=True)
-	country = Column(String(320), default='', primary_key=True)
-	group = Column(String(320), default='')
-	
-	# COVID-19 stats about this datapoint
+class Stats:
+	# COVID-19 stats, shared by datapoints and datapoint intervals
 	total = Column(Integer, default=0)
 	recovered = Column(Integer, default=0)
 	deaths = Column(Integer, default=0)
@@ -124,6 +177,31 @@ class Datapoint(Base):
 
 		return change
 
+	def stats(self):
+		return {label: getattr(self, label) for label in stat_labels}
+
+class Datapoint(Stats, Base):
+	# Readers use the `datapoints` view, which also covers the archive
+	__tablename__ = "datapoints_live"
+	# readers still look datapoints up (and join them) by name
+	__table_args__ = (Index('location_names', 'country', 'province', 'county', 'entry_date'),)
+
+	def __init__(self, data):
+		super().__init__(**data)
+
+	# locations.location_id
+	location_id = Column(Integer, primary_key=True, autoincrement=False)
+
+	# columns about the date/time of the datapoint
+	entry_date = Column(String(16), primary_key=True)
+	update_time = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+	
+	# columns about the nominal location. these are kept for readers, but the key is location_id
+	county = Column(String(320), default='')
+	province = Column(String(320), default='')
+	country = Column(String(320), default='')
+	group = Column(String(320), default='')
+
 	def location_tuple(self):
 		return self.country, self.province, self.county
 
@@ -136,29 +214,90 @@ class Datapoint(Base):
 
 	def parents(self):
 		date_str = self.date_str()
-		
-		if self.country:
-			yield ("", "", "", date_str)
-		
-		if self.province:
-			yield (self.country, "", "", date_str)
-
-		if self.county:
-			yield (self.country, self.province, "", date_str)
+		for country, province, county in location_parents(self.country, self.province, self.county):
+			yield (country, province, county, date_str)
 
 	@property
 	def t(self):
 		return self.country, self.province, self.county, self.date_str()
 
+	@property
+	def key(self):
+		return self.location_id, self.date_str()
+
 	def __str__(self):
 		return self.__repr__()
 	
 	def __repr__(self):
 		return f"<Datapoint {self.t}>"
 
+class DatapointInterval(Stats, Base):
+	# A run of days where a location's stats didn't change. See intervals.py
+	__tablename__ = "datapoint_intervals"
+
+	location_id = Column(Integer, primary_key=True, autoincrement=False)
+	valid_from = Column(String(16), primary_key=True)
+	# inclusive
+	valid_to = Column(String(16), index=True)
+	update_time = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+	def __repr__(self):
+		return f"<DatapointInterval {self.location_id} {self.valid_from}..{self.valid_to}>"
+
+class Rollup:
+	# Per-location summaries of a week or a month. See rollups.py
+	location_id = Column(Integer, primary_key=True, autoincrement=False)
+	period_start = Column(String(16), primary_key=True)
+	period_end = Column(String(16))
+	# the last day in the period that has data
+	last_date = Column(String(16))
+
+	# values at the end of the period
+	total = Column(Integer, default=0)
+	recovered = Column(Integer, default=0)
+	deaths = Column(Integer, default=0)
+	serious = Column(Integer, default=0)
+	tests = Column(Integer, default=0)
+	hospitalized = Column(Integer, default=0)
+
+	# sums of the daily increases during the period
+	dtotal = Column(Integer, default=0)
+	drecovered = Column(Integer, default=0)
+	ddeaths = Column(Integer, default=0)
+	dtests = Column(Integer, default=0)
+
+	# average daily increase over the 7 days up to last_date
+	avg_dtotal = Column(Float)
+	avg_drecovered = Column(Float)
+	avg_ddeaths = Column(Float)
+	avg_dtests = Column(Float)
+
+	update_time = Column(DateTime, default=datetime.utcnow)
+
+class WeeklyRollup(Rollup, Base):
+	__tablename__ = "weekly_rollups"
+
+class MonthlyRollup(Rollup, Base):
+	__tablename__ = "monthly_rollups"
+
+# Months that are no longer collected are moved here by partitioning.py
+datapoints_archive = Table(
+	"datapoints_archive", Base.metadata,
+	*[column.copy() for column in Datapoint.__table__.columns],
+	Index('archive_location_names', 'country', 'province', 'county', 'entry_date')
+)
+
+# One row per day, for expanding intervals into days in the datapoints view. Filled by partitioning.py
+calendar_days = Table(
+	"calendar_days", Base.metadata,
+	Column("entry_date", String(16), primary_key=True)
+)
+
 class Hospital(Base):
 	__tablename__ = "hospitals"
 	hospital_id = Column(Integer, primary_key=True)
+	# the id of the hospital in the dataset it was loaded from
+	source_id = Column(String(64), unique=True)
 	hospital_name = Column(String(256))
 	hospital_type = Column(String(256))
 	address1 = Column(String(256))
@@ -174,11 +313,266 @@ class Hospital(Base):
 	potential_beds_increase = Column(Integer, default=0)
 	average_ventilator_usage = Column(Integer, default=0)
 
+	latitude = Column(Float(10, 6))
+	longitude = Column(Float(10, 6))
+	# see spatial.py
+	grid_cell = Column(Integer, index=True)
+
+class LocationCapacity(Base):
+	# Hospital capacity within radius_km of each location's latitude/longitude
+	__tablename__ = "location_capacity"
+	location_id = Column(Integer, primary_key=True, autoincrement=False)
+	radius_km = Column(Float)
+	hospitals = Column(Integer, default=0)
+	licensed_beds = Column(Integer, default=0)
+	staffed_beds = Column(Integer, default=0)
+	icu_beds = Column(Integer, default=0)
+	adult_icu_beds = Column(Integer, default=0)
+	pediatric_icu_beds = Column(Integer, default=0)
+	update_time = Column(DateTime)
+
+class Mobility(Base):
+	# Daily community mobility per location, as a percent change from the baseline. See data_imports/import_mobility.py
+	__tablename__ = "mobility"
+	location_id = Column(Integer, primary_key=True, autoincrement=False)
+	entry_date = Column(String(16), primary_key=True)
+	retail_change = Column(Float)
+	grocery_change = Column(Float)
+	parks_change = Column(Float)
+	transit_change = Column(Float)
+	workplaces_change = Column(Float)
+	residential_change = Column(Float)
+	update_time = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SourceWatermark(Base):
+	# The latest entry_date that each incremental source has fully imported. See watermarks.py
+	__tablename__ = "source_watermarks"
+	source = Column(String(256), primary_key=True)
+	entry_date = Column(String(16))
+	update_time = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class LocationFreshness(Base):
+	# When each location's stats last changed, and when a source last reported it. See freshness.py
+	__tablename__ = "location_freshness"
+	location_id = Column(Integer, primary_key=True, autoincrement=False)
+	last_changed = Column(DateTime, index=True)
+	last_seen = Column(DateTime, index=True)
+	source = Column(String(256))
+
+class LocationMatch(Base):
+	# Unseen location names that were matched to known ones, or nearly were. See location_resolver.py
+	__tablename__ = "location_matches"
+	match_id = Column(Integer, primary_key=True)
+	country = Column(String(256), default='')
+	province = Column(String(256), default='')
+	county = Column(String(256), default='')
+	# the level (0 = country, 1 = province, 2 = county) whose name was matched
+	level = Column(Integer)
+	matched_name = Column(String(256))
+	score = Column(Float)
+	accepted = Column(Boolean)
+	match_time = Column(DateTime, default=datetime.utcnow)
+
+def location_parents(country, province, county):
+	"""All of the locations that a location's stats are summed into"""
+	if country:
+		yield ("", "", "")
+	
+	if province:
+		yield (country, "", "")
+
+	if county:
+		yield (country, province, "")
+
+def location_parent(country, province, county):
+	"""The location whose sum directly includes this one, if any"""
+	if county:
+		return (country, province, "") if province else None
+	elif province:
+		return (country, "", "")
+	elif country:
+		return ("", "", "")
+
+class LocationIndex:
+	"""
+	In-process map between location names and location_ids. The locations table
+	is small, so it's loaded once per process and kept in sync as locations are
+	created. Locations created in a transaction that gets rolled back are
+	forgotten again by try_commit.
+	"""
+	def __init__(self):
+		self.ids = {}
+		self.names = {}
+		self.fips = {}
+		self.children = defaultdict(set)
+		# group name <-> location_id, and the country-level location_ids in each group
+		self.groups = {}
+		self.group_names = {}
+		self.group_children = defaultdict(set)
+		# known names, for matching unseen ones, and the unseen names that were matched
+		self.resolver = location_resolver.Resolver()
+		self.resolved = {}
+		self.pending = set()
+		self.loaded = False
+
+	def load(self, session):
+		if self.loaded:
+			return
+
+		for location_id, country, province, county, group, fips in session.query(Location.location_id, Location.country, Location.province, Location.county, Location.group, Location.fips):
+			self._add(location_id, (country, province, county), group)
+			if fips:
+				self.fips[location_id] = fips
+
+		self.loaded = True
+
+	def _add(self, location_id, t, group=''):
+		self.names[location_id] = t
+		if group and not any(t):
+			self.groups[group] = location_id
+			self.group_names[location_id] = group
+			return
+
+		self.ids[t] = location_id
+		self.resolver.add(t)
+		parent = location_parent(*t)
+		if parent is not None:
+			self.children[parent].add(location_id)
+		if parent == ("", "", ""):
+			self.group_children[standards.group_of(t[0])].add(location_id)
+
+	def _remove(self, location_id):
+		t = self.names.pop(location_id)
+		if location_id in self.group_names:
+			del self.groups[self.group_names.pop(location_id)]
+			return
+
+		del self.ids[t]
+		self.resolver.remove(t)
+		self.resolved = {name: resolved for name, resolved in self.resolved.items() if resolved != t}
+		self.fips.pop(location_id, None)
+		parent = location_parent(*t)
+		if parent is not None:
+			self.children[parent].discard(location_id)
+		if parent == ("", "", ""):
+			self.group_children[standards.group_of(t[0])].discard(location_id)
+
+	def get_id(self, session, country, province='', county='', resolve=True):
+		self.load(session)
+
+		t = (country, province, county)
+		if t in self.ids:
+			return self.ids[t]
+
+		if t in self.resolved:
+			return self.get_id(session, *self.resolved[t], resolve=False)
+
+		location = session.query(Location).filter_by(country=country, province=province, county=county, group='').first()
+		if location is None and resolve and resolve_location_names:
+			resolved = self.resolve(session, t)
+			if resolved != t:
+				return self.get_id(session, *resolved, resolve=False)
+
+		if location is None:
+			location = Location(country=country, province=province, county=county, group='', country_code=standards.country_codes_reverse.get(country))
+			session.add(location)
+			session.flush()
+			self.pending.add(location.location_id)
+
+		self._add(location.location_id, t)
+		return location.location_id
+
+	def resolve(self, session, t):
+		"""The known names that an unseen name most likely refers to. Every match that was tried is logged."""
+		resolved, matches = self.resolver.resolve(t)
+		for match in matches:
+			session.add(LocationMatch(country=t[0], province=t[1], county=t[2], level=match.level, matched_name=match.matched_name, score=match.score, accepted=match.accepted))
+			if not silent_mode:
+				print(f"{'Matched' if match.accepted else 'Did not match'} {match.name!r} to {match.matched_name!r} ({match.score:.2f})")
+
+		if resolved != t:
+			self.resolved[t] = resolved
+		return resolved
+
+	def get_group_id(self, session, group):
+		"""The location_id of a group's aggregate row, which is created on first use"""
+		self.load(session)
+
+		if group in self.groups:
+			return self.groups[group]
+
+		location = session.query(Location).filter_by(country='', province='', county='', group=group).first()
+		if location is None:
+			location = Location(country='', province='', county='', group=group)
+			session.add(location)
+			session.flush()
+			self.pending.add(location.location_id)
+
+		self._add(location.location_id, ('', '', ''), group)
+		return location.location_id
+
+	def set_fips(self, session, location_id, fips):
+		if self.fips.get(location_id) != fips:
+			session.query(Location).get(location_id).fips = fips
+			self.fips[location_id] = fips
+
+	def assign_ids(self, rows, session):
+		"""Sets the location_id of each datapoint row. FIPS codes are moved onto the location."""
+		for row in rows:
+			fips = row.pop('fips', None)
+			row['location_id'] = self.get_id(session, row['country'], row['province'], row['county'])
+			# the names may have been matched to a known location's
+			names = self.names[row['location_id']]
+			if names != (row['country'], row['province'], row['county']):
+				row['country'], row['province'], row['county'] = names
+				row['group'] = standards.group_of(names[0])
+			if fips:
+				self.set_fips(session, row['location_id'], fips)
+
+	def group_of(self, location_id):
+		if location_id in self.group_names:
+			return self.group_names[location_id]
+		return standards.group_of(self.names[location_id][0])
+
+	def ancestor_ids(self, session, location_id):
+		if location_id in self.group_names:
+			return []
+
+		ancestors = [self.get_id(session, *t) for t in location_parents(*self.names[location_id])]
+
+		# countries (and everything in them) are also counted in their group
+		group = self.group_of(location_id)
+		if group:
+			ancestors.append(self.get_group_id(session, group))
+
+		return ancestors
+
+	def children_of(self, location_id):
+		if location_id in self.group_names:
+			return self.group_children[self.group_names[location_id]]
+		return self.children[self.names[location_id]]
+
+	def depth(self, location_id):
+		# groups and the world are both sums of countries, so they share the top level
+		return sum(1 for name in self.names[location_id] if name)
+
+	def confirm_pending(self):
+		self.pending.clear()
+
+	def discard_pending(self):
+		for location_id in self.pending:
+			self._remove(location_id)
+		self.pending.clear()
+
+location_index = LocationIndex()
+
 def try_commit(sess):
 	try:
 		sess.commit()
+		location_index.confirm_pending()
 	except:
 		sess.rollback()
+		location_index.discard_pending()
 		raise
 	finally:
 		sess.close()
@@ -0,0 +1,51 @@
+"""
+Streaming reads of large, date-sorted CSV files (like the NYT county history).
+
+The response is read line by line instead of as one string. When the ISO date
+is the first column, lines before the start date are skipped by comparing
+their first 10 characters, before they're split into fields. The rest come
+out in chunks of whole dates, so each chunk can be uploaded on its own.
+"""
+
+import csv
+import requests
+
+# rows per chunk, rounded up to the end of a date
+chunk_size = 20000
+
+def iter_csv(url, start_date='', date_column='date', timeout=10, encoding='utf-8'):
+    """
+    Yields a dict per row, keyed by the header. If date_column is the first
+    column, the lines before start_date aren't parsed at all.
+    """
+    response = requests.get(url, timeout=timeout, stream=True)
+    response.raise_for_status()
+    response.encoding = encoding
+    with response:
+        lines = response.iter_lines(decode_unicode=True)
+        header = next(csv.reader([next(lines)]))
+        if start_date and header and header[0] == date_column:
+            lines = (line for line in lines if line[:10] >= start_date)
+        for row in csv.reader(lines):
+            if row:
+                yield dict(zip(header, row))
+
+def date_chunks(rows, start_date='', date_column='date', chunk_size=chunk_size):
+    """
+    Groups rows into lists of whole dates, skipping the rows before start_date
+    that iter_csv couldn't skip. Dates are compared as ISO strings.
+    """
+    chunk = []
+    for row in rows:
+        date_str = row[date_column]
+        if date_str < start_date:
+            continue
+
+        if len(chunk) >= chunk_size and date_str != chunk[-1][date_column]:
+            yield chunk
+            chunk = []
+
+        chunk.append(row)
+
+    if chunk:
+        yield chunk
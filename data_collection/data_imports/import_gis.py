@@ -2,36 +2,105 @@ import re
 import sys
 import json
 import json_extractor
+import json_stream
 import upload
 import geometry
 import requests
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
 from defaults import get_defaults
 
-def import_gis(gis_url, table_labels, use_geometry=False, geometry_precision=6):
-    query_url = gis_url + "/query?f=geojson&outFields=*&where=1%3D1"
+# pages fetched at the same time
+max_workers = 4
+
+def get_fields(table_labels):
+    """The attributes that table_labels read from, or None if that can't be worked out"""
+    fields = set()
+    for labels in table_labels.values():
+        for selectors in labels.values():
+            if type(selectors) != list:
+                continue
+            if not selectors or type(selectors[0]) != str or selectors[0].startswith("::"):
+                return None
+            fields.add(selectors[0])
+    return sorted(fields)
+
+def get_layer_info(gis_url):
+    try:
+        return requests.get(gis_url + "?f=json", timeout=10).json()
+    except (requests.RequestException, ValueError):
+        return {}
+
+def get_count(gis_url, where):
+    """The number of features matching where, or None if the server didn't say (ArcGIS reports errors as {"error": ...})"""
+    params = {"f": "json", "where": where, "returnCountOnly": "true"}
+    try:
+        response = requests.get(gis_url + "/query?" + urlencode(params), timeout=10).json()
+    except (requests.RequestException, ValueError):
+        return None
+    if 'error' in response:
+        return None
+    return response.get('count')
+
+def import_gis(gis_url, table_labels, use_geometry=False, geometry_precision=6, where="1=1", order_by=None, page_size=None):
+    """
+    Queries an ArcGIS feature layer. Only the fields in table_labels are requested, and
+    layers with more features than the server returns at once are read page by page,
+    with the pages fetched concurrently. where and order_by are passed through as the
+    query's where and orderByFields, so a source can ask for only the new features.
+    """
+    gis_url = gis_url.rstrip("/")
+    fields = get_fields(table_labels)
+    params = {"f": "geojson", "where": where, "outFields": ",".join(fields) if fields else "*"}
 
     if use_geometry == True:
-        query_url += "&returnGeometry=true&outSR=4326&geometryPrecision=" + str(geometry_precision)
+        params.update({"returnGeometry": "true", "outSR": "4326", "geometryPrecision": str(geometry_precision)})
     else:
-        query_url += "&returnGeometry=false"
-        
-    return import_geojson(query_url=query_url, table_labels=table_labels, use_geometry=use_geometry)
+        params["returnGeometry"] = "false"
 
-def import_geojson(query_url, table_labels, use_geometry=True):
-    content = {}
+    layer = get_layer_info(gis_url)
+    supports_pagination = layer.get('advancedQueryCapabilities', {}).get('supportsPagination', False)
+    page_size = page_size or layer.get('maxRecordCount', 1000)
+
+    # pages only line up if the features are in a fixed order
+    order_by = order_by or layer.get('objectIdField')
+    if order_by:
+        params["orderByFields"] = order_by
+
+    count = get_count(gis_url, where) if supports_pagination else None
 
-    geojson = requests.get(query_url, timeout=10).json()
+    # without a count, the pages can't be laid out, so the layer is read with one query
+    if count is None:
+        return import_geojson(query_url=gis_url + "/query?" + urlencode(params), table_labels=table_labels, use_geometry=use_geometry)
 
+    query_urls = [
+        gis_url + "/query?" + urlencode({**params, "resultOffset": offset, "resultRecordCount": page_size})
+        for offset in range(0, max(count, 1), page_size)
+    ]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pages = executor.map(lambda query_url: import_geojson(query_url=query_url, table_labels=table_labels, use_geometry=use_geometry), query_urls)
+
+        content = {table: [] for table in table_labels.keys()}
+        for page in pages:
+            for table, rows in page.items():
+                content[table].extend(rows)
+
+    return content
+
+def import_geojson(query_url, table_labels, use_geometry=True):
     defaults = get_defaults()
-    for table in table_labels.keys():
-        content[table] = []
-        labels = {**defaults[table], **table_labels[table]}
-        for feature in geojson['features']:
-            row = json_extractor.extract_json_row(feature['properties'], labels)
+    extractors = {table: json_extractor.compile_labels({**defaults[table], **table_labels[table]}) for table in table_labels.keys()}
+    content = {table: [] for table in table_labels.keys()}
+
+    # features are decoded one at a time, straight from the response
+    for feature in json_stream.iter_json_url(query_url, ['features']):
+        for table, extract_row in extractors.items():
+            row = extract_row(feature['properties'])
             if 'geometry' in feature and feature['geometry'] and table == 'location':
                 if 'latitude' not in table_labels['location']:
-                    lng, lat = geometry.get_center_long_lat(feature['geometry'])
+                    lng, lat = geometry.get_center_long_lat(feature['geometry'], key=(row.get('country'), row.get('province'), row.get('county')))
                     row['longitude'] = lng
                     row['latitude'] = lat
 
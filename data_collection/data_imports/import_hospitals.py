@@ -0,0 +1,204 @@
+"""
+Usage: python -m data_imports.import_hospitals <csv-path-or-url> [--replace]
+
+Loads a hospital capacity dataset into the hospitals table, and keeps the
+location_capacity table (beds within a radius of each location) up to date.
+
+The CSV is streamed in batches, so it's never held in memory all at once.
+Hospitals are matched on source_id, so reloading a newer version of the
+dataset replaces the old rows. Rows without one can't be matched, so a file
+with those should be reloaded with --replace. Only locations near the hospitals that were
+loaded get their capacity recalculated, from the hospitals read with one
+query and grouped by grid cell.
+"""
+
+import csv
+import sys
+import requests
+from collections import defaultdict
+from datetime import datetime
+
+from corona_sql import Session, Hospital, Location, LocationCapacity, try_commit
+import spatial
+import standards
+
+# Columns of the Definitive Healthcare USA hospital beds dataset
+hospital_columns = {
+    "source_id": "FID",
+    "hospital_name": "HOSPITAL_NAME",
+    "hospital_type": "HOSPITAL_TYPE",
+    "address1": "HQ_ADDRESS",
+    "address2": "HQ_ADDRESS1",
+    "province": "STATE_NAME",
+    "county": "COUNTY_NAME",
+    "licensed_beds": "NUM_LICENSED_BEDS",
+    "staffed_beds": "NUM_STAFFED_BEDS",
+    "icu_beds": "NUM_ICU_BEDS",
+    "adult_icu_beds": "ADULT_ICU_BEDS",
+    "pediatric_icu_beds": "PEDI_ICU_BEDS",
+    "potential_beds_increase": "Potential_Increase_In_Bed_Capac",
+    "average_ventilator_usage": "AVG_VENTILATOR_USAGE",
+    "latitude": "Y",
+    "longitude": "X"
+}
+
+count_labels = ['licensed_beds', 'staffed_beds', 'icu_beds', 'adult_icu_beds', 'pediatric_icu_beds', 'potential_beds_increase', 'average_ventilator_usage']
+capacity_labels = ['licensed_beds', 'staffed_beds', 'icu_beds', 'adult_icu_beds', 'pediatric_icu_beds']
+
+default_radius_km = 50
+
+def count(value):
+    try:
+        return max(int(float(value)), 0)
+    except (TypeError, ValueError):
+        return 0
+
+def coordinate(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def read_lines(path_or_url):
+    if path_or_url.startswith("http://") or path_or_url.startswith("https://"):
+        response = requests.get(path_or_url, stream=True, timeout=10)
+        response.raise_for_status()
+        # text/csv without a charset would otherwise be decoded as ISO-8859-1
+        response.encoding = "utf-8"
+        lines = response.iter_lines(decode_unicode=True)
+        first = next(lines, None)
+        if first is not None:
+            # like utf-8-sig for local files
+            yield first.lstrip("\ufeff")
+            yield from lines
+    else:
+        with open(path_or_url, encoding="utf-8-sig", newline="") as f:
+            yield from f
+
+def read_batches(path_or_url, batch_size):
+    batch = []
+    for row in csv.DictReader(read_lines(path_or_url)):
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def import_hospitals(path_or_url, columns=hospital_columns, country="United States", replace=False, batch_size=1000, radius_km=default_radius_km):
+    # the same few thousand names repeat across the whole file
+    names = {}
+    touched_cells = set()
+
+    if replace:
+        session = Session()
+        touched_cells.update(cell for cell, in session.query(Hospital.grid_cell).distinct() if cell is not None)
+        session.query(Hospital).delete()
+        try_commit(session)
+
+    loaded = 0
+    for batch in read_batches(path_or_url, batch_size):
+        rows = []
+        for source_row in batch:
+            row = {label: source_row.get(column) for label, column in columns.items()}
+            # source_id is unique, so rows without one are stored with NULL rather than ''
+            row['source_id'] = row.get('source_id') or None
+            raw_name = row.get('country') or country, row.get('province') or '', row.get('county') or ''
+            if raw_name not in names:
+                names[raw_name] = standards.normalize_name(*raw_name)
+            row['country'], row['province'], row['county'] = names[raw_name]
+
+            for label in count_labels:
+                row[label] = count(row.get(label))
+
+            row['latitude'] = coordinate(row.get('latitude'))
+            row['longitude'] = coordinate(row.get('longitude'))
+            if row['latitude'] is not None and row['longitude'] is not None:
+                row['grid_cell'] = spatial.cell_of(row['latitude'], row['longitude'])
+                touched_cells.add(row['grid_cell'])
+            else:
+                row['grid_cell'] = None
+
+            rows.append(row)
+
+        session = Session()
+
+        # hospitals that are being replaced may have moved, so their old cells change too
+        source_ids = [row['source_id'] for row in rows if row.get('source_id')]
+        if source_ids:
+            old = session.query(Hospital.grid_cell).filter(Hospital.source_id.in_(source_ids))
+            touched_cells.update(cell for cell, in old if cell is not None)
+            session.query(Hospital).filter(Hospital.source_id.in_(source_ids)).delete(synchronize_session=False)
+
+        session.execute(Hospital.__table__.insert(), rows)
+        try_commit(session)
+
+        loaded += len(rows)
+        print(f"\rLoaded {loaded} hospitals", end='\r')
+
+    print(f"Loaded {loaded} hospitals from {len(names)} distinct locations")
+    refresh_capacity(touched_cells, radius_km)
+
+def hospitals_by_cell(session, cells=None, chunk_size=1000):
+    """The hospitals in cells (or all of them, if None), by grid cell, read with one query per chunk of cells"""
+    columns = [Hospital.grid_cell, Hospital.latitude, Hospital.longitude, *[getattr(Hospital, label) for label in capacity_labels]]
+    query = session.query(*columns).filter(Hospital.grid_cell != None)
+
+    if cells is None:
+        chunks = [query]
+    else:
+        cells = sorted(cells)
+        chunks = [query.filter(Hospital.grid_cell.in_(cells[i:i + chunk_size])) for i in range(0, len(cells), chunk_size)]
+
+    by_cell = defaultdict(list)
+    for chunk in chunks:
+        for hospital in chunk:
+            by_cell[hospital.grid_cell].append(hospital)
+    return by_cell
+
+def hospitals_near(by_cell, latitude, longitude, radius_km=default_radius_km):
+    """All hospitals within radius_km of a point, looked up in the hospitals_by_cell index"""
+    return [
+        hospital
+        for cell in spatial.cells_within(latitude, longitude, radius_km)
+        for hospital in by_cell.get(cell, ())
+        if spatial.distance_km(latitude, longitude, hospital.latitude, hospital.longitude) <= radius_km
+    ]
+
+def refresh_capacity(touched_cells=None, radius_km=default_radius_km, batch_size=1000):
+    """Recalculates location_capacity for the locations whose radius overlaps touched_cells (or all of them, if None)"""
+    session = Session()
+    locations = session.query(Location.location_id, Location.latitude, Location.longitude).filter(Location.latitude != None, Location.longitude != None)
+
+    # the locations to refresh, and every cell that their radius covers
+    nearby = []
+    cells = set()
+    for location_id, latitude, longitude in locations.all():
+        location_cells = spatial.cells_within(latitude, longitude, radius_km)
+        if touched_cells is not None and touched_cells.isdisjoint(location_cells):
+            continue
+        nearby.append((location_id, latitude, longitude))
+        cells.update(location_cells)
+
+    by_cell = hospitals_by_cell(session, None if touched_cells is None else cells)
+
+    update_time = datetime.utcnow()
+    capacities = []
+    for location_id, latitude, longitude in nearby:
+        hospitals = hospitals_near(by_cell, latitude, longitude, radius_km)
+        capacity = {"location_id": location_id, "radius_km": radius_km, "hospitals": len(hospitals), "update_time": update_time}
+        for label in capacity_labels:
+            capacity[label] = sum(getattr(hospital, label) or 0 for hospital in hospitals)
+        capacities.append(capacity)
+
+    # the old rows are replaced a batch at a time, instead of merged one by one
+    for i in range(0, len(capacities), batch_size):
+        batch = capacities[i:i + batch_size]
+        session.query(LocationCapacity).filter(LocationCapacity.location_id.in_([capacity["location_id"] for capacity in batch])).delete(synchronize_session=False)
+        session.execute(LocationCapacity.__table__.insert(), batch)
+
+    try_commit(session)
+    print(f"Refreshed hospital capacity for {len(capacities)} locations")
+
+if __name__ == "__main__":
+    import_hospitals(sys.argv[1], replace="--replace" in sys.argv[2:])
@@ -1,10 +1,24 @@
 import pandas as pd
 import numpy as np
 import io
-from upload import upload
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, date
 import requests
 
+# Past days' reports don't change, so they're kept on disk after the first download
+cache_dir = os.environ.get('JHU_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'corona-vision', 'jhu'))
+
+# reports from the last few days can still be revised
+mutable_days = 2
+
+# reports downloaded at the same time
+max_workers = 8
+
+first_date = date(2020, 3, 10)
+
 def import_csv_data(csv_text, entry_date):
 	# load the CSV data
 	string_io = io.StringIO(csv_text)
@@ -27,99 +41,105 @@ def import_csv_data(csv_text, entry_date):
 		elif "confirm" in col.lower(): total_col = col
 		elif "recover" in col.lower(): recovered_col = col
 	
-	content = {
-		'datapoint': [],
-		'location': []
-	}
-
 	df.sort_values(by=[col for col in [county_col, province_col, country_col] if col], ascending=False)
-	
-	for _, row in df.iterrows():
-		# Steps
-		# 1. Find country, province, and county name
-		# 2. Get the actual coronavirus numbers
-		# 3. Estimate the location if we can
-
-		# STEP 1 #
-		country = row[country_col]
-		province = row[province_col] if not pd.isnull(row[province_col]) else ''
-		county = row[county_col] if county_col else ''
-
-		## FOR DEBUG ##
-		if ("Korea" not in country):
-			continue
-
-		# STEP 2 #
-		total = row[total_col]
-		deaths = row[death_col]
-		recovered = row[recovered_col]
-
-		if not total: total = 0
-		if not deaths: deaths = 0
-		if not recovered: recovered = 0
-
-		location_row = {}
-		datapoint_row = {}
-
-		if province == 'Recovered':
-			datapoint_row = {
-				"country": country,
-				"recovered": recovered,
-				"entry_date": entry_date
-			}
-
-			location_row = { "country": country }
-		else:
-			datapoint_row = {
-				"country": country,
-				"province": province,
-				"county": county,
-				"total": total,
-				"deaths": deaths,
-				"recovered": recovered,
-				"entry_date": entry_date
-			}
-
-			location_row = {
-				"country": country,
-				"province": province,
-				"county": county
-			}
-
-		# Save the primary location data if we can
-		if lat_col and lng_col:
-			lat, lng = row[lat_col], row[lng_col]
-			if lat and lng:
-				location_row['latitude'] = lat
-				location_row['longitude'] = lng
-
-		content['location'].append(location_row)
-		content['datapoint'].append(datapoint_row)
-	return content
 
-def import_jhu_date(entry_date):
+	# Steps
+	# 1. Find country, province, and county name
+	# 2. Get the actual coronavirus numbers
+	# 3. Estimate the location if we can
+
+	# STEP 1 #
+	frame = pd.DataFrame(index=df.index)
+	frame['country'] = df[country_col]
+	frame['province'] = df[province_col].fillna('') if province_col else ''
+	frame['county'] = df[county_col] if county_col else ''
+
+	# STEP 2 #
+	for label, col in [('total', total_col), ('deaths', death_col), ('recovered', recovered_col)]:
+		frame[label] = df[col].where(df[col].astype(bool), 0) if col else 0
+	frame['entry_date'] = entry_date
+
+	# the 'Recovered' rows only have the recovered count for the whole country
+	is_recovered = frame['province'] == 'Recovered'
+	frame.loc[is_recovered, ['province', 'county']] = ''
+
+	datapoints = frame[['country', 'province', 'county', 'total', 'deaths', 'recovered', 'entry_date']].to_dict('records')
+	for datapoint_row, recovered_only in zip(datapoints, is_recovered):
+		if recovered_only:
+			del datapoint_row['province'], datapoint_row['county'], datapoint_row['total'], datapoint_row['deaths']
+
+	locations = frame[['country', 'province', 'county']]
+
+	# Save the primary location data if we can
+	if lat_col and lng_col:
+		locations = locations.assign(latitude=df[lat_col], longitude=df[lng_col])
+
+	location_rows = locations.to_dict('records')
+	for location_row, recovered_only in zip(location_rows, is_recovered):
+		if recovered_only:
+			del location_row['province'], location_row['county']
+		if 'latitude' in location_row and not (location_row['latitude'] and location_row['longitude']):
+			del location_row['latitude'], location_row['longitude']
+
+	return {
+		'datapoint': datapoints,
+		'location': location_rows
+	}
+
+def get_jhu_csv(entry_date):
+	"""The daily report's CSV text, from the cache if it's there, or None if there's no report for that day"""
 	date_formatted = entry_date.strftime("%m-%d-%Y")
-	print("\rLoading data from JHU " + date_formatted + '...', end='\r')
-	
+	cache_path = os.path.join(cache_dir, date_formatted + ".csv")
+	if os.path.exists(cache_path):
+		with open(cache_path, encoding="utf-8") as f:
+			return f.read()
+
 	# download from Github
 	github_raw_url = f"https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_daily_reports/{date_formatted}.csv"
 	response = requests.get(github_raw_url, timeout=10)
+	if response.status_code != 200:
+		return None
+
+	if entry_date < date.today() - timedelta(days=mutable_days):
+		os.makedirs(cache_dir, exist_ok=True)
+		# written to a temporary name first, so a partial file is never read back
+		with open(cache_path + ".part", "w", encoding="utf-8") as f:
+			f.write(response.text)
+		os.replace(cache_path + ".part", cache_path)
+
+	return response.text
+
+def import_jhu_date(entry_date):
+	print("\rLoading data from JHU " + entry_date.strftime("%m-%d-%Y") + '...', end='\r')
+	csv_text = get_jhu_csv(entry_date)
 	
-	if response.status_code == 200:
-		return import_csv_data(response.text, entry_date)
+	if csv_text is not None:
+		return import_csv_data(csv_text, entry_date)
 	else:
 		print("404 not found")
 
 def import_jhu_date_range(date_1, date_2):
-	next_date = timedelta(days=1)
-	current_date = date_1
-	
-	while current_date <= date_2:
-		print("Loading JHU data for", current_date, "                                      ")
-		result = import_jhu_date(current_date)
-		if result:
-			yield result
-		current_date += next_date
-
-def import_jhu_historical():
-	return import_jhu_date_range(date_1=date(2020, 3, 10), date_2=date.today())
+	"""Yields each day's content in date order. The days are downloaded and parsed in parallel."""
+	dates = [date_1 + timedelta(days=days) for days in range((date_2 - date_1).days + 1)]
+
+	with ThreadPoolExecutor(max_workers=max_workers) as executor:
+		# only a few days ahead of the upload are kept in memory
+		pending = deque()
+		for entry_date in dates:
+			pending.append(executor.submit(import_jhu_date, entry_date))
+			if len(pending) >= max_workers * 2:
+				result = pending.popleft().result()
+				if result:
+					yield result
+
+		while pending:
+			result = pending.popleft().result()
+			if result:
+				yield result
+
+def import_jhu_historical(start_date=None):
+	if start_date:
+		date_1 = max(first_date, date.fromisoformat(start_date))
+	else:
+		date_1 = first_date
+	return import_jhu_date_range(date_1=date_1, date_2=date.today())
@@ -0,0 +1,85 @@
+"""
+Usage: python -m data_imports.import_jhu_timeseries [<start-date>]
+
+Imports the whole JHU global history from its three wide time series files
+(confirmed, deaths and recovered, one column per day), instead of one daily
+report per day. Each file is melted to one row per (country, province, date),
+the three are joined, and the result is uploaded a few dates at a time.
+"""
+
+import io
+import sys
+from datetime import datetime
+
+import pandas as pd
+import requests
+
+series_url = "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_{}_global.csv"
+
+# file name -> datapoint label
+metrics = {
+    "confirmed": "total",
+    "deaths": "deaths",
+    "recovered": "recovered"
+}
+
+location_columns = {"Country/Region": "country", "Province/State": "province"}
+
+# dates per upload
+dates_per_chunk = 7
+
+def read_series(name):
+    """One metric's history, as a long frame of (country, province, date, value)"""
+    df = pd.read_csv(io.StringIO(requests.get(series_url.format(name), timeout=30).text))
+    df = df.rename(columns=location_columns)
+    df['province'] = df['province'].fillna('')
+
+    date_columns = [column for column in df.columns if column not in ('country', 'province', 'Lat', 'Long')]
+    long = df.melt(id_vars=['country', 'province'], value_vars=date_columns, var_name='date', value_name=metrics[name])
+
+    # the headers are like 3/9/20, and there are only a few hundred of them
+    iso_dates = {column: datetime.strptime(column, "%m/%d/%y").date().isoformat() for column in date_columns}
+    long['date'] = long['date'].map(iso_dates)
+
+    # a few locations are listed twice
+    return long.groupby(['country', 'province', 'date'], as_index=False).sum()
+
+def read_history(start_date=''):
+    history = None
+    for name in metrics:
+        series = read_series(name)
+        if start_date:
+            series = series[series['date'] >= start_date]
+
+        if history is None:
+            history = series
+        else:
+            history = history.merge(series, on=['country', 'province', 'date'], how='outer')
+
+    return history.sort_values('date')
+
+def as_rows(frame):
+    rows = frame.rename(columns={'date': 'entry_date'}).astype(object).to_dict('records')
+    for row in rows:
+        row['entry_date'] = datetime.strptime(row['entry_date'], "%Y-%m-%d").date()
+        for label in metrics.values():
+            # a metric that's missing for a location (like recovered in the US) is left out
+            if pd.isnull(row[label]):
+                del row[label]
+            else:
+                row[label] = int(row[label])
+    return rows
+
+def import_history(start_date=''):
+    """Yields lists of datapoints, a few whole dates at a time, in date order"""
+    history = read_history(start_date)
+    dates = history['date'].unique()
+    for i in range(0, len(dates), dates_per_chunk):
+        chunk_dates = dates[i:i + dates_per_chunk]
+        yield as_rows(history[history['date'].isin(chunk_dates)])
+
+if __name__ == "__main__":
+    import upload
+    for chunk in import_history(sys.argv[1] if len(sys.argv) > 1 else ''):
+        print("Uploading", chunk[0]['entry_date'], "to", chunk[-1]['entry_date'])
+        upload.upload_datapoints(chunk)
@@ -0,0 +1,109 @@
+"""
+Usage: python -m data_imports.import_mobility <csv-path-or-url> [<start-date>]
+
+Loads a community mobility report (like Google's Global_Mobility_Report.csv)
+into the mobility table: one row per location per day, with the percent change
+from the baseline for each kind of place.
+
+The file is read in chunks, and only the columns that are used are parsed.
+It repeats the same few thousand region names millions of times, so each
+distinct name is normalized (and given a location_id) once, and joined back
+onto the rows. Rows are written with a bulk upsert, so reloading a newer
+report replaces the days it overlaps.
+"""
+
+import sys
+
+import pandas as pd
+
+from corona_sql import Session, Mobility, engine, location_index, try_commit
+import standards
+
+# report column -> location name
+name_columns = {
+    "country_region": "country",
+    "sub_region_1": "province",
+    "sub_region_2": "county"
+}
+
+# report column -> mobility table column
+change_columns = {
+    "retail_and_recreation_percent_change_from_baseline": "retail_change",
+    "grocery_and_pharmacy_percent_change_from_baseline": "grocery_change",
+    "parks_percent_change_from_baseline": "parks_change",
+    "transit_stations_percent_change_from_baseline": "transit_change",
+    "workplaces_percent_change_from_baseline": "workplaces_change",
+    "residential_percent_change_from_baseline": "residential_change"
+}
+
+# metro areas overlap the regions, so their rows are skipped
+metro_column = "metro_area"
+
+used_columns = {*name_columns, *change_columns, metro_column, "date"}
+
+chunk_size = 100000
+
+def upsert(table):
+    if engine.dialect.name == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table)
+        return statement.on_duplicate_key_update({column.name: statement.inserted[column.name] for column in table.columns if not column.primary_key})
+    return table.insert().prefix_with("OR REPLACE")
+
+def read_chunks(path_or_url, start_date=''):
+    """Chunks of the report, with just the used columns, and without metro areas or days before start_date"""
+    chunks = pd.read_csv(
+        path_or_url,
+        usecols=lambda column: column in used_columns,
+        dtype={column: str for column in [*name_columns, metro_column, "date"]},
+        keep_default_na=False,
+        na_values={column: [''] for column in change_columns},
+        chunksize=chunk_size
+    )
+    for chunk in chunks:
+        if metro_column in chunk:
+            chunk = chunk[chunk[metro_column] == '']
+        if start_date:
+            chunk = chunk[chunk['date'] >= start_date]
+        if len(chunk):
+            yield chunk.rename(columns=name_columns)
+
+def location_ids(session, chunk, known):
+    """The location_id of each row, looking up each distinct name only once across the whole file"""
+    names = chunk[['country', 'province', 'county']].drop_duplicates()
+    for raw_name in names.itertuples(index=False, name=None):
+        if raw_name not in known:
+            known[raw_name] = location_index.get_id(session, *standards.normalize_name(*raw_name))
+
+    keys = pd.MultiIndex.from_frame(chunk[['country', 'province', 'county']])
+    return pd.Series(known, dtype=object).reindex(keys).to_numpy()
+
+def as_rows(chunk, ids):
+    # ISO strings, like datapoints.entry_date, so the two can be joined
+    frame = pd.DataFrame({'location_id': ids, 'entry_date': pd.to_datetime(chunk['date']).dt.strftime('%Y-%m-%d').to_numpy()})
+    for column, label in change_columns.items():
+        frame[label] = chunk[column].to_numpy() if column in chunk else None
+
+    # a region can be split across rows that normalize to the same location
+    frame = frame.drop_duplicates(['location_id', 'entry_date'], keep='last')
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict('records')
+
+def import_mobility(path_or_url, start_date=''):
+    # raw names -> location_id
+    known = {}
+
+    loaded = 0
+    for chunk in read_chunks(path_or_url, start_date):
+        session = Session()
+        rows = as_rows(chunk, location_ids(session, chunk, known))
+        session.execute(upsert(Mobility.__table__), rows)
+        try_commit(session)
+
+        loaded += len(rows)
+        print(f"\rLoaded {loaded} mobility rows", end='\r')
+
+    print(f"Loaded {loaded} mobility rows for {len(set(known.values()))} locations")
+
+if __name__ == "__main__":
+    import_mobility(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else '')
@@ -0,0 +1,100 @@
+"""
+Usage: python -m data_imports.import_population <csv-path> [<year>]
+
+Fills in locations.population and locations.population_density from a local
+population dataset (by default, the UN World Population Prospects CSV, with
+population in thousands and density in people per km²). Densities are stored
+in thousands of people per km², the unit of the prediction's popdensity feature.
+
+Names are normalized once per distinct name, and the dataset is matched to
+the locations table with a single join instead of a query per row. Locations
+are updated in batches, and the names that didn't match any location are
+listed at the end, so they can be added as aliases.
+"""
+
+import sys
+
+import pandas as pd
+
+from corona_sql import Session, Location, try_commit
+import standards
+
+# Columns of the UN World Population Prospects dataset
+population_columns = {
+    "country": "Location",
+    "population": "PopTotal",
+    "population_density": "PopDensity"
+}
+
+# Only the medium projection is used
+variant = "Medium"
+
+# the dataset's density (people per km²) is divided by this for locations.population_density
+density_scale = 1000
+
+name_labels = ['country', 'province', 'county']
+
+batch_size = 1000
+
+def read_population(path, columns=population_columns, year=2020):
+    """The dataset's rows for one year, labelled like locations"""
+    filters = {"Variant", "Time"}
+    df = pd.read_csv(path, usecols=lambda column: column in filters or column in columns.values(), keep_default_na=False, na_values={columns[label]: [''] for label in ['population', 'population_density'] if label in columns})
+    if "Variant" in df:
+        df = df[df["Variant"] == variant]
+    if "Time" in df:
+        df = df[df["Time"] == year]
+
+    df = df.rename(columns={column: label for label, column in columns.items()})
+    if 'population_density' in df:
+        df['population_density'] = df['population_density'] / density_scale
+    for label in name_labels:
+        if label not in df:
+            df[label] = ''
+    return df
+
+def normalize_names(df):
+    """Adds the normalized names of each row, normalizing each distinct name once"""
+    raw = df[name_labels].drop_duplicates()
+    normalized = pd.DataFrame([standards.normalize_name(*name) for name in raw.itertuples(index=False, name=None)], columns=name_labels, index=raw.index)
+    raw = raw.join(normalized, rsuffix='_normalized')
+    return df.merge(raw, on=name_labels, how='left')
+
+def load_locations(session):
+    query = session.query(Location.location_id, Location.country, Location.province, Location.county).filter(Location.group == '')
+    return pd.DataFrame(query.all(), columns=['location_id', *name_labels])
+
+def import_population(path, columns=population_columns, year=2020):
+    df = normalize_names(read_population(path, columns, year))
+
+    session = Session()
+    locations = load_locations(session)
+    session.close()
+
+    normalized_labels = [label + '_normalized' for label in name_labels]
+    matched = df.merge(locations, left_on=normalized_labels, right_on=name_labels, how='left', suffixes=('', '_location'))
+
+    unmatched = matched[matched['location_id'].isna()]
+    matched = matched[matched['location_id'].notna()].drop_duplicates('location_id', keep='last')
+    matched['location_id'] = matched['location_id'].astype(int)
+
+    updates = matched[['location_id', 'population', 'population_density']].astype(object)
+    updates = updates.where(updates.notna(), None).to_dict('records')
+    for i in range(0, len(updates), batch_size):
+        session = Session()
+        session.bulk_update_mappings(Location, updates[i:i + batch_size])
+        try_commit(session)
+        print(f"\rUpdated {min(i + batch_size, len(updates))}/{len(updates)} locations", end='\r')
+
+    print(f"Updated the population of {len(updates)} locations")
+
+    unmatched_names = sorted(set(unmatched[name_labels].itertuples(index=False, name=None)))
+    if unmatched_names:
+        print(f"{len(unmatched_names)} names didn't match a location:")
+        for name in unmatched_names:
+            print("   ", ", ".join(part for part in reversed(name) if part))
+
+    return unmatched_names
+
+if __name__ == "__main__":
+    import_population(sys.argv[1], year=int(sys.argv[2]) if len(sys.argv) > 2 else 2020)
@@ -1,8 +1,10 @@
 import pandas as pd
 import requests
 from bs4 import BeautifulSoup
-from json_extractor import extract_json_row, json_methods, find_json
+from json_extractor import compile_labels, json_methods, find_json
 from defaults import get_defaults
+import json_stream
+import html_tables
 from datetime import date
 
 def get_elem(soup, selector_chain):
@@ -17,39 +19,90 @@ def get_elem(soup, selector_chain):
 				elem = elem.select(selector)
 	return elem
 
-def import_table(url, table_selector, table_labels, rows=slice(None, None, None)):
-	soup = BeautifulSoup(requests.get(url, timeout=10).text, "html.parser")
-	df = pd.read_html(get_elem(soup, table_selector).prettify(), keep_default_na=False, na_values=['_'])[0]
-	return import_df(df=df, table_labels=table_labels, rows=rows)
+def table_df(table, na_values=['_']):
+	"""A DataFrame of a table's cell texts. Columns that are all numbers (with thousands separators) are converted, like pd.read_html does."""
+	columns = html_tables.header(table)
+	cells = [row.cells for row in html_tables.body_rows(table)]
 
-def import_df(df, table_labels, rows):
+	width = max([len(columns)] + [len(row) for row in cells])
+	columns = list(columns) + list(range(len(columns), width))
+	df = pd.DataFrame([row + [''] * (width - len(row)) for row in cells], columns=columns)
+
+	for column in df.columns:
+		texts = df[column].str.strip()
+		texts = texts.mask(texts.isin(na_values))
+		try:
+			df[column] = pd.to_numeric(texts.str.replace(",", "", regex=False))
+		except ValueError:
+			df[column] = texts
+
+	return df
+
+def import_table(url, table_selector, table_labels, rows=slice(None, None, None), tag=None):
+	"""
+	With tag (and table_selector as a dict of attributes), only that element of the page is parsed.
+	Otherwise table_selector is a selector chain run on the whole page, like get_elem.
+	"""
+	html = requests.get(url, timeout=10).text
+	if tag is not None:
+		table = html_tables.find_table(html, tag, **table_selector)
+	else:
+		table = get_elem(BeautifulSoup(html, "lxml"), table_selector)
+	return import_df(df=table_df(table), table_labels=table_labels, rows=rows)
+
+def df_column(df, selectors):
+	"""A label's column: the first selector names the column, and any ::methods after it are mapped over it"""
+	column, *methods = selectors
+	if type(column) == int and column not in df.columns:
+		series = df.iloc[:, column]
+	else:
+		series = df[column]
+
+	for method in methods:
+		series = series.map(json_methods[method])
+	return series
+
+def extract_df_rows(df, labels):
+	"""
+	The DataFrame version of extract_json_row. labels use the same format as table_labels,
+	but each column is extracted once for the whole frame, instead of once per row.
+	"""
+	constants = {label: value for label, value in labels.items() if type(value) != list and value is not None}
+	columns = pd.DataFrame({label: df_column(df, selectors) for label, selectors in labels.items() if type(selectors) == list}, index=df.index)
+
+	rows = columns.to_dict('records')
+	for row in rows:
+		for label in [label for label, value in row.items() if value is None]:
+			del row[label]
+		row.update(constants)
+	return rows
+
+def import_df(df, table_labels, rows=slice(None, None, None)):
 	content = {'datapoint': []}
 
 	for table in table_labels.keys():
-		content[table] = []
-		labels = table_labels[table]
-		for _, feature in df.iloc[rows].iterrows():
-			content[table].append(extract_json_row(feature, labels))
+		content[table] = extract_df_rows(df.iloc[rows], table_labels[table])
 		
 	return content
 
-def import_json(url, table_labels, namespace=['features'], allow=[], use_datestr=False):
+def import_json(url, table_labels, namespace=['features'], allow=[], use_datestr=False, stream=True):
 	if use_datestr:
 		url = date.today().strftime(url)
-	resp = requests.get(url, timeout=10)
 
-	features = find_json(resp.json(), namespace)
-	if type(features) != list:
-		features = [features]
+	if stream and json_stream.can_stream(namespace):
+		# the features are decoded one at a time, straight from the response
+		features = json_stream.iter_json_url(url, namespace)
+	else:
+		features = find_json(requests.get(url, timeout=10).json(), namespace)
+		if type(features) != list:
+			features = [features]
 
 	defaults = get_defaults()
+	extractors = {table: compile_labels({**defaults[table], **table_labels[table]}) for table in table_labels.keys()}
+	content = {table: [] for table in table_labels.keys()}
 
-	content = {}
-
-	for table in table_labels.keys():
-		content[table] = []
-		labels = {**defaults[table], **table_labels[table]}
-		for feature in features:
-			content[table].append(extract_json_row(feature, labels))
+	for feature in features:
+		for table, extract_row in extractors.items():
+			content[table].append(extract_row(feature))
 	
-	return content
\ No newline at end of file
+	return content
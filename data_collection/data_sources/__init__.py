@@ -3,8 +3,18 @@ from collections import defaultdict
 data_groups = defaultdict(list)
 data_names = {}
 
-def source(*group_names, name=''):
+def source(*group_names, name='', chunked=False, incremental=False):
+    """
+    Registers a data source. A chunked source yields lists of datapoints
+    (like one list per few dates), and each list is uploaded on its own.
+
+    An incremental source publishes its whole history. Only the dates from
+    a few days before its watermark are uploaded, and if it takes a
+    start_date argument, it's asked for only those dates (see watermarks.py).
+    """
     def add_source(func):
+        func.chunked = chunked
+        func.incremental = incremental
         for group_name in group_names:
             data_groups[group_name].append((func, name))
             data_names[name] = func
@@ -14,8 +24,10 @@ def source(*group_names, name=''):
     return add_source
 
 import traceback
+import inspect
 import sys
 import upload
+import watermarks
 
 import data_sources.africa
 import data_sources.australia
@@ -26,27 +38,58 @@ import data_sources.south_america
 
 import data_sources.worldometers
 
-def import_by_name(name, verbose=False, force_update=False):
+def upload_source(func, name, verbose=False, force_update=False, full=False):
+    start_date = None
+    if func.incremental and not full:
+        start_date = watermarks.start_date(name)
+
+    kwargs = {}
+    if start_date and 'start_date' in inspect.signature(func).parameters:
+        print("Importing from", start_date)
+        kwargs['start_date'] = start_date
+
+    if func.chunked:
+        chunks = func(**kwargs)
+    else:
+        chunks = [[datapoint for datapoint in func(**kwargs)]]
+
+    for chunk in chunks:
+        if start_date:
+            chunk = watermarks.since(chunk, start_date)
+
+        upload.upload_datapoints(chunk, verbose, force_update, source=name)
+
+        if func.incremental:
+            watermarks.advance(name, chunk)
+
+def import_by_name(name, verbose=False, force_update=False, full=False):
     if name in data_names:
         func = data_names[name]
         print("Importing data from", name, "...")
 
-        results = [datapoint for datapoint in func()]
-        upload.upload_datapoints(results, verbose, force_update)
+        upload_source(func, name, verbose, force_update, full)
 
-def import_group(name, verbose=False, force_update=False):
+def import_group(name, verbose=False, force_update=False, full=False):
     for func, func_name in data_groups[name]:
         try:
             print("Importing data from", func_name, "...")
 
-            results = [datapoint for datapoint in func()]
-            upload.upload_datapoints(results, verbose, force_update)
+            upload_source(func, func_name, verbose, force_update, full)
         except Exception as e:
             sys.stderr.write("Exception during group data import: {} [type {}]".format(e, type(e)))
             traceback.print_tb(e.__traceback__)
 
-def import_jhu_historical():
-    from import_jhu import import_jhu_date, import_jhu_historical
-    import upload
-    for data in import_jhu_historical():
-        upload.upload(data)
+@source('jhu', name='JHU Daily Reports', chunked=True, incremental=True)
+def import_jhu_historical(start_date=None):
+    from data_imports import import_jhu
+
+    # one upload per day, in date order
+    for data in import_jhu.import_jhu_historical(start_date):
+        yield data['datapoint']
+
+@source('jhu-timeseries', name='JHU Time Series', chunked=True, incremental=True)
+def import_jhu_timeseries(start_date=None):
+    from data_imports import import_jhu_timeseries
+
+    # the whole history comes from three downloads
+    yield from import_jhu_timeseries.import_history(start_date or '')
@@ -1,11 +1,12 @@
 """
-Usage: data.py [-g <group>] [-d <source-name>] [--verbose] [--force-update] [--repeat]
+Usage: data.py [-g <group>] [-d <source-name>] [--verbose] [--force-update] [--repeat] [--full]
 
 -g <group>              The group to upload from.
 -d <source-name>        The data source to download.
 --verbose               Prints out data as it goes.
 --force-update          Updates totals, even if there were no changes.
 --repeat                Will repeat the data uploads forever.
+--full                  Imports the whole history of incremental sources, ignoring their watermarks.
 """
 
 import corona_sql
@@ -18,6 +19,7 @@ import docopt
 args = docopt.docopt(__doc__)
 verbose = args['--verbose']
 force_update = args['--force-update']
+full = args['--full']
 
 repeat = args['--repeat']
 done_once = False
@@ -25,11 +27,11 @@ done_once = False
 if args['-d'] is not None:
     data_source_name = args['-d']
     while repeat or not done_once:
-        data_sources.import_by_name(data_source_name, verbose=verbose, force_update=force_update)
+        data_sources.import_by_name(data_source_name, verbose=verbose, force_update=force_update, full=full)
         done_once = True
 elif args['-g'] is not None:
     while repeat or not done_once:
-        data_sources.import_group(args['-g'], verbose=verbose, force_update=force_update)
+        data_sources.import_group(args['-g'], verbose=verbose, force_update=force_update, full=full)
         done_once = True
 else:
     print(__doc__)
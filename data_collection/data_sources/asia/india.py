@@ -1,29 +1,26 @@
 import requests
 from data_sources import source
-from bs4 import BeautifulSoup
+import html_tables
 
 @source('live', name='India')
 def import_data():
     
     url = "https://www.mohfw.gov.in/"
-    soup = BeautifulSoup(requests.get(url, timeout=10).text, "html.parser")
-    body = soup.select_one("#state-data tbody")
-    rows = body.select("tr")
+    # #state-data is the element around the table
+    rows = html_tables.extract_table(requests.get(url, timeout=10).text, tag=None, id="state-data")
 
-    datapoints = []
-    for row in rows:
-        if "total" in row.text.lower():
+    for stats, _ in rows:
+        if "total" in "".join(stats).lower():
             continue
-        stats = row.select("td")
 
         if len(stats) < 5:
             continue
         
-        _rank = stats[0].text
-        province = stats[1].text
-        total = stats[2].text
-        recovered = stats[3].text
-        deaths = stats[4].text
+        _rank = stats[0]
+        province = stats[1]
+        total = stats[2]
+        recovered = stats[3]
+        deaths = stats[4]
         
         yield {
             "country": "India",
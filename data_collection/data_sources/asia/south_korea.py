@@ -1,26 +1,23 @@
 import requests
 import json_extractor
-from bs4 import BeautifulSoup
+import html_tables
 from data_sources import source
 
 @source('live', name='South Korea')
 def import_data():
     
     url = "http://ncov.mohw.go.kr/en/bdBoardList.do?brdId=16&brdGubun=162&dataGubun=&ncvContSeq=&contSeq=&board_id="
-    soup = BeautifulSoup(requests.get(url, timeout=10).text, "html.parser")
-    body = soup.select_one("table.num tbody")
-    rows = body.select("tr")
+    rows = html_tables.extract_table(requests.get(url, timeout=10).text, cells=html_tables.all_cells, class_="num")
 
-    datapoints = []
-    for row in rows:
-        if "total" in row.text.lower():
+    for cells, _ in rows:
+        if "total" in "".join(cells).lower():
             continue
-        stats = row.select("td")
 
-        province = row.select_one("th").text
-        total = stats[3].text
-        recovered = stats[5].text
-        deaths = stats[6].text
+        # the province is in a <th>, before the stats
+        province, *stats = cells
+        total = stats[3]
+        recovered = stats[5]
+        deaths = stats[6]
         
         yield {
             "country": "South Korea",
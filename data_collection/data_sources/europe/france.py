@@ -28,14 +28,15 @@ def import_dashboard():
 
     yield parse_datapoint(latest)
 
-@source('historical', name='France')
-def import_historical_data():
+@source('historical', name='France', incremental=True)
+def import_historical_data(start_date=''):
     from datetime import datetime
     url = "https://dashboard.covid19.data.gouv.fr/data/code-FRA.json"
     rq = requests.get(url, timeout=10).json()
 
     for row in rq:
-        yield parse_datapoint(row)
+        if row['date'] >= start_date:
+            yield parse_datapoint(row)
 
 def import_date(d):
     url = d.strftime("https://dashboard.covid19.data.gouv.fr/data/date-%Y-%m-%d.json")
@@ -1,5 +1,5 @@
 import requests
-from data_parser import import_df
+from data_parser import extract_df_rows
 from data_sources import source
 
 minWait = 600
@@ -8,86 +8,61 @@ def import_data():
 	import_provinces()
 	import_counties()
 
+county_labels = {
+	"country": "Italy",
+	"province": ["denominazione_regione"],
+	"county": ["denominazione_provincia"],
+	"total": ["totale_casi"]
+}
+
+province_labels = {
+	"country": "Italy",
+	"province": ["denominazione_regione"],
+	"total": ["totale_casi"],
+	# Hospitalized != Hospitalized with symptoms
+	"serious": ["terapia_intensiva"],
+	"hospitalized": ["totale_ospedalizzati"],
+	"recovered": ["dimessi_guariti"],
+	"deaths": ["deceduti"],
+	"tests": ["casi_testati"]
+}
+
 @source('live', name='Italy Counties')
 def import_counties():
 	import io
 	import pandas as pd
-	import datetime
 	csvSource = "https://raw.githubusercontent.com/pcm-dpc/COVID-19/master/dati-province/dpc-covid19-ita-province-latest.csv"
 	sourceLink = "https://github.com/pcm-dpc/COVID-19/blob/master/dati-province/dpc-covid19-ita-province-latest.csv"
 
 	rq = requests.get(csvSource, timeout=10)
 	dataframe = pd.read_csv(io.StringIO(rq.text))
 
-	datapoints = []
-	locations = []
-	for _, row in dataframe.iterrows():
-		date, _, _, province, _, county, _, latitude, longitude, total, _, _ = row
-		yield {
-			"country": "Italy",
-			"province": province,
-			"county": county,
-			"total": total,
-			# "entry_date": datetime.datetime.strptime(date[:10], "%Y-%m-%d").date()
-		}
+	yield from extract_df_rows(dataframe, county_labels)
 
 @source('live', name='Italy provinces')
 def import_provinces():
 	import io
 	import pandas as pd
-	import datetime
 	csvSource = "https://raw.githubusercontent.com/pcm-dpc/COVID-19/master/dati-regioni/dpc-covid19-ita-regioni-latest.csv"
 	sourceLink = "https://github.com/pcm-dpc/COVID-19/blob/master/dati-regioni/dpc-covid19-ita-regioni-latest.csv"
 
 	rq = requests.get(csvSource, timeout=10)
 	dataframe = pd.read_csv(io.StringIO(rq.text))
 
-	datapoints = []
-	locations = []
-	for _, row in dataframe.iterrows():
-		# Hospitalized != Hospitalized with symptoms
-		date, countryCode, provinceCode, province, latitude, longitude, hosp_symptoms, serious, hospitalized, homeIsolation, activeCases, variationActive, newActive, recovered, deaths, total, swabs, caseTests, noteIt, noteEn = row
+	yield from extract_df_rows(dataframe, province_labels)
 
-		yield {
-			"country": "Italy",
-			"province": province,
-			"total": total,
-			"serious": serious,
-			"hospitalized": hospitalized,
-			"recovered": recovered,
-			"deaths": deaths,
-			"tests": caseTests,
-			# "entry_date": datetime.datetime.strptime(date[:10], "%Y-%m-%d").date()
-		}
-
-@source('historical', name='Italy Provinces')
-def import_provinces_historical():
+@source('historical', name='Italy Provinces', incremental=True)
+def import_provinces_historical(start_date=''):
 	print("Loading from historical Italy provinces...")
 	import io
 	import pandas as pd
-	import datetime
 	csvSource = "https://raw.githubusercontent.com/pcm-dpc/COVID-19/master/dati-regioni/dpc-covid19-ita-regioni.csv"
 	sourceLink = "https://github.com/pcm-dpc/COVID-19/blob/master/dati-regioni/dpc-covid19-ita-regioni.csv"
 
 	rq = requests.get(csvSource, timeout=10)
 	dataframe = pd.read_csv(io.StringIO(rq.text))
 
-	datapoints = []
-	locations = []
-	for _, row in dataframe.iterrows():
-		# Hospitalized != Hospitalized with symptoms
-		dateStr, countryCode, provinceCode, province, latitude, longitude, hosp_symptoms, serious, hospitalized, homeIsolation, activeCases, variationActive, newActive, recovered, deaths, total, swabs, caseTests, noteIt, noteEn = row
-		date = datetime.datetime.strptime(dateStr[:10], "%Y-%m-%d").date()
-		
-		if date >= datetime.date(2020, 4, 10):
-			yield {
-				"country": "Italy",
-				"province": province,
-				"total": total,
-				"serious": serious,
-				"hospitalized": hospitalized,
-				"recovered": recovered,
-				"deaths": deaths,
-				"tests": caseTests,
-				"entry_date": date
-			}
+	# dates are ISO strings, so they compare in order
+	dataframe = dataframe[dataframe['data'].str[:10] >= max("2020-04-10", start_date)]
+
+	yield from extract_df_rows(dataframe, {**province_labels, "entry_date": ["data", "::iso_date"]})
@@ -1,17 +1,17 @@
 import requests
 import datetime
-from bs4 import BeautifulSoup
+import html_tables
 from data_sources import source
 
-@source('live', name='Canada')
-def import_data():
-    for result in import_news():
+@source('live', name='Canada', incremental=True)
+def import_data(start_date=''):
+    for result in import_news(start_date):
         yield result
 
     for result in import_gov():
         yield result
 
-def import_news():
+def import_news(start_date=''):
     import string
     sourceURL = "https://www.ctvnews.ca/health/coronavirus/tracking-every-case-of-covid-19-in-canada-1.4852102"
     jsonURL = "https://stats.ctvnews.ca/covidDapi/getAllCovidData"
@@ -24,6 +24,9 @@ def import_news():
     datapoints = []
     content = requests.get(jsonURL, headers=headers, timeout=10).json()
     for row in content:
+        if row['date'] < start_date:
+            continue
+
         entryDate = datetime.datetime.strptime(row['date'], "%Y-%m-%d").date()
         provinces = row['data']
         for data in provinces:
@@ -45,14 +48,11 @@ def import_news():
 
 def import_gov():
     url = "https://www.canada.ca/en/public-health/services/diseases/2019-novel-coronavirus-infection.html"
-    soup = BeautifulSoup(requests.get(url, timeout=10).text, 'html.parser')
-    stats = soup.select("#dataTable tbody tr")
-    datapoints = []
-    for row in stats:
-        tds = row.select("td")
-        province = tds[0].text
-        total = int(tds[1].text.replace(",", ""))
-        deaths = int(tds[3].text.replace(",", ""))
+    stats = html_tables.extract_table(requests.get(url, timeout=10).text, id="dataTable")
+    for tds, _ in stats:
+        province = tds[0]
+        total = int(tds[1].replace(",", ""))
+        deaths = int(tds[3].replace(",", ""))
         if province != "Canada":
             yield {
                 'country': "Canada",
@@ -2,6 +2,7 @@ import requests
 from data_imports.import_gis import import_geojson
 from datetime import datetime
 from data_sources import source
+import csv_stream
 
 @source('live', name='United States')
 def import_data():
@@ -18,38 +19,45 @@ def import_data():
 			}
 		})['datapoint']
 
-@source('historical', 'us-states', name="United States Historical")
-def import_hist_states():
-	stateList = requests.get("https://raw.githubusercontent.com/nytimes/covid-19-data/master/us-states.csv", timeout=10).text
+# the first dates to import from the NYT history
+states_start_date = '2020-04-21'
+counties_start_date = '2020-05-21'
+
+@source('historical', 'us-states', name="United States Historical", chunked=True, incremental=True)
+def import_hist_states(start_date=None):
 	#"https://github.com/nytimes/covid-19-data"
-	datapoints = []
-	for row in stateList.split("\n")[1:]:
-		dateStr, province, fips, cases, deaths = row.split(",")
-		if dateStr > '2020-04-20':
-			yield {
-				'entry_date': datetime.strptime(dateStr, "%Y-%m-%d").date(),
+	start_date = max(start_date or '', states_start_date)
+	rows = csv_stream.iter_csv("https://raw.githubusercontent.com/nytimes/covid-19-data/master/us-states.csv", start_date)
+	for chunk in csv_stream.date_chunks(rows, start_date):
+		yield [
+			{
+				'entry_date': datetime.strptime(row['date'], "%Y-%m-%d").date(),
 				'country': 'United States',
-				'province': province,
-				'total': int(cases),
-				'deaths': int(deaths)
+				'province': row['state'],
+				'fips': row['fips'],
+				'total': int(row['cases']),
+				'deaths': int(row['deaths'])
 			}
-	print(f"Uploading {len(datapoints)} historical datapoints")
-
-@source('historical', 'us-counties', name='United States Counties Historical')
-def import_hist_counties():
-	countyList = requests.get("https://raw.githubusercontent.com/nytimes/covid-19-data/master/us-counties.csv", timeout=10).text
+			for row in chunk
+		]
 
-	for row in countyList.split("\n")[1:]:
-		dateStr, county, province, fips, cases, deaths = row.split(",")
-		if dateStr > '2020-05-20':
-			yield {
-				'entry_date': datetime.strptime(dateStr, "%Y-%m-%d").date(),
+@source('historical', 'us-counties', name='United States Counties Historical', chunked=True, incremental=True)
+def import_hist_counties(start_date=None):
+	start_date = max(start_date or '', counties_start_date)
+	rows = csv_stream.iter_csv("https://raw.githubusercontent.com/nytimes/covid-19-data/master/us-counties.csv", start_date)
+	for chunk in csv_stream.date_chunks(rows, start_date):
+		yield [
+			{
+				'entry_date': datetime.strptime(row['date'], "%Y-%m-%d").date(),
 				'country': 'United States',
-				'province': province,
-				'county': county,
-				'total': int(cases),
-				'deaths': int(deaths)
+				'province': row['state'],
+				'county': row['county'],
+				'fips': row['fips'],
+				'total': int(row['cases']),
+				'deaths': int(row['deaths'])
 			}
+			for row in chunk
+		]
 
 
 def import_uk():
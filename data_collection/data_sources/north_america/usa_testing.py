@@ -17,23 +17,23 @@ def import_data():
 			'recovered': row['recovered'] or 0
 		}
 
-@source('historical', name='USA Testing')
-def import_historical_data():
-	from data_parser import import_json
+historical_labels = {
+	"entry_date": ["date", "::str", "::ymd"],
+	"country": "United States",
+	"province": ["state", "::us_state_code"],
+	"tests": ["total"],
+	"hospitalized": ["hospitalized"],
+	"recovered": ["recovered"]
+}
+
+@source('historical', name='USA Testing', incremental=True)
+def import_historical_data(start_date=''):
+	import json_stream
 	print("Uploading historical USA testing data...")
-	results = import_json(
-		url="https://covidtracking.com/api/v1/states/daily.json",
-		table_labels={
-			"datapoint": {
-				"entry_date": ["date", "::str", "::ymd"],
-				"country": "United States",
-				"province": ["state", "::us_state_code"],
-				"tests": ["total"],
-				"hospitalized": ["hospitalized"],
-				"recovered": ["recovered"]
-			}
-		},
-		namespace=[]
-	)
 
-	upload.upload(results)
\ No newline at end of file
+	# dates are numbers like 20200410, so they're compared before anything else is extracted
+	first_date = start_date.replace("-", "")
+	extract_row = json_extractor.compile_labels(historical_labels)
+	for row in json_stream.iter_json_url("https://covidtracking.com/api/v1/states/daily.json", []):
+		if str(row['date']) >= first_date:
+			yield extract_row(row)
\ No newline at end of file
@@ -2,6 +2,13 @@ import requests
 from bs4 import BeautifulSoup
 from datetime import date, datetime, timedelta
 from data_sources import source
+import pdf_text
+
+# pages of the report with the provinces' totals
+report_pages = (0, 1)
+
+# the most complete report (evening, then morning) found for each day
+found_reports = {}
 
 @source('live', name='Argentina')
 def import_data():
@@ -12,14 +19,18 @@ def import_data():
 
     urlv = ar_date.strftime("https://www.argentina.gob.ar/sites/default/files/%d-%m-%y-reporte-vespertino-covid-19.pdf")
     urlm = ar_date.strftime("https://www.argentina.gob.ar/sites/default/files/%d-%m-%y-reporte-matutino-covid-19.pdf")
-    
-    rq_evening = requests.get(urlv, timeout=10)
-    if rq_evening.status_code == 200:
-        return import_pdf(rq_evening.content, ar_date)
-        
-    rq_morning = requests.get(urlm, timeout=10)
-    if rq_morning.status_code == 200:
-        return import_pdf(rq_morning.content, ar_date)
+
+    # once the evening report is out, the morning one isn't needed
+    if found_reports.get(ar_date) == urlv:
+        urls = [urlv]
+    else:
+        urls = [urlv, urlm]
+
+    for url in urls:
+        tokens = pdf_text.fetch_tokens(url, report_pages)
+        if tokens is not None:
+            found_reports[ar_date] = url
+            return parse_tokens(tokens, ar_date)
 
     return iter(())
 
@@ -60,19 +71,11 @@ def expandObject(obj, depth=0):
         expandObject(obj.getObject(), depth)
 
 def import_pdf(content: bytes, entry_date: date) -> None:
-    from io import BytesIO
-    from PyPDF2 import PdfFileReader
-    from PyPDF2.pdf import ContentStream
-    import re
-    bytesio = BytesIO(content)
-    reader = PdfFileReader(bytesio)
-    firstPage = reader.getPage(0)
-    secondPage = reader.getPage(1)
-    i = 0
+    return parse_tokens(pdf_text.extract_tokens(content, report_pages), entry_date)
 
-    tokens = re.split(r'\s+', firstPage.extractText() + '\n' + secondPage.extractText())
-
-    found = True
+def parse_tokens(tokens, entry_date: date):
+    i = 0
+    found = False
 
     while i < len(tokens):
         if tokens[i] == '-':
@@ -1,5 +1,6 @@
 import requests
 import standards
+import html_tables
 from bs4 import BeautifulSoup
 from data_sources import source
 
@@ -9,30 +10,26 @@ def has_class(node, cls):
 @source('live', name='Worldometers')
 def import_data():
     data = requests.get("http://www.worldometers.info/coronavirus")
-    soup = BeautifulSoup(data.text, "html.parser")
-    table = soup.find("table", id="main_table_countries_today")
 
-    for row in table.find("tbody").findAll("tr"):
-        if row.has_attr("data-continent"):
+    for columns, attrs in html_tables.extract_table(data.text, id="main_table_countries_today"):
+        if "data-continent" in attrs:
             continue
-        
-        columns = row.findAll("td")
 
-        rank = columns[0].text
-        name = columns[1].text
-        total = columns[2].text
-        # dtotal = columns[3].text
-        deaths = columns[4].text
-        # ddeaths = columns[5].text
-        recovered = columns[6].text
-        # drecovered = columns[7].text
-        active = columns[8].text
-        serious = columns[9].text
-        # cases_mil = columns[10].text
-        # deaths_mil = columns[11].text
-        tests = columns[12].text
-        # tests_mil = columns[13].text
-        # population = columns[14].text
+        rank = columns[0]
+        name = columns[1]
+        total = columns[2]
+        # dtotal = columns[3]
+        deaths = columns[4]
+        # ddeaths = columns[5]
+        recovered = columns[6]
+        # drecovered = columns[7]
+        active = columns[8]
+        serious = columns[9]
+        # cases_mil = columns[10]
+        # deaths_mil = columns[11]
+        tests = columns[12]
+        # tests_mil = columns[13]
+        # population = columns[14]
         
         # This country has a data dispute with Worldometers
         if name == "France":
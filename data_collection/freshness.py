@@ -0,0 +1,45 @@
+"""
+The location_freshness table: one row per location, with when its stats
+last changed and when a source last reported it (changed or not).
+
+Staleness checks, incremental exports and cache invalidation can find the
+recently changed locations through the indexes on last_changed and
+last_seen, instead of scanning datapoints. upload_datapoints keeps it up
+to date: the locations in an upload are marked as seen by its source, and
+every location whose stats changed (including recounted parents) is marked
+as changed.
+"""
+
+from datetime import datetime
+
+from corona_sql import LocationFreshness
+
+# locations per query
+chunk_size = 500
+
+def update_freshness(session, reported, changed, source=None):
+    """
+    reported -- location_ids that were in the upload
+    changed -- location_ids with a datapoint that changed
+    """
+    now = datetime.utcnow()
+
+    location_ids = sorted(set(reported) | set(changed))
+    for i in range(0, len(location_ids), chunk_size):
+        chunk = location_ids[i:i + chunk_size]
+        existing = session.query(LocationFreshness).filter(LocationFreshness.location_id.in_(chunk))
+        rows = {row.location_id: row for row in existing}
+
+        for location_id in chunk:
+            if location_id not in rows:
+                rows[location_id] = LocationFreshness(location_id=location_id)
+                session.add(rows[location_id])
+
+            row = rows[location_id]
+            if location_id in reported:
+                row.last_seen = now
+                if source:
+                    row.source = source
+
+            if location_id in changed:
+                row.last_changed = now
@@ -1,26 +1,118 @@
-def get_poly_center(coordinates):
-    main_string = coordinates[0]
-    return get_string_center(main_string)
-
-def get_string_center(coordinates):
-    sum_long = 0
-    sum_lat = 0
-    if len(coordinates) == 0:
-        return None, None
+import hashlib
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+# area is in km², from an equal-area (sinusoidal) projection of the degrees
+Shape = namedtuple("Shape", ["center", "bbox", "area"])
+
+km_per_degree = 111.32
+
+# locations whose shapes are kept in memory
+max_cached = 4096
+
+# location key -> (hash of the coordinates, Shape), least recently used first
+shape_cache = OrderedDict()
+
+def get_rings(geo):
+    """Each ring as an (n, 2) array of (lng, lat), and whether it's an outer ring (not a hole)"""
+    if geo['type'] == 'Polygon':
+        polygons = [geo['coordinates']]
+    elif geo['type'] == 'MultiPolygon':
+        polygons = geo['coordinates']
     else:
-        for coordinate in coordinates:
-            lng, lat = coordinate
-            sum_long += lng
-            sum_lat += lat
-        return sum_long/len(coordinates), sum_lat/len(coordinates)
+        return [], []
+
+    rings, outer = [], []
+    for polygon in polygons:
+        for i, ring in enumerate(polygon):
+            ring = np.asarray(ring, dtype=float)
+            if len(ring) >= 3:
+                rings.append(ring[:, :2])
+                outer.append(i == 0)
+    return rings, outer
+
+def get_poly_shape(geo):
+    return rings_shape(*get_rings(geo))
+
+def rings_shape(rings, outer):
+    if not rings:
+        return None
+
+    sizes = [len(ring) for ring in rings]
+    points = np.concatenate(rings)
+    following = np.concatenate([np.roll(ring, -1, axis=0) for ring in rings])
+    ring_ids = np.repeat(np.arange(len(rings)), sizes)
+
+    x, y = points[:, 0], points[:, 1]
+    next_x, next_y = following[:, 0], following[:, 1]
+
+    # shoelace formula, summed per ring
+    cross = x * next_y - next_x * y
+    signed_areas = np.bincount(ring_ids, cross) / 2
+    moments_x = np.bincount(ring_ids, (x + next_x) * cross) / 6
+    moments_y = np.bincount(ring_ids, (y + next_y) * cross) / 6
 
-def get_center_long_lat(geo):
+    # holes are subtracted, whichever way their vertices wind
+    weights = np.where(outer, 1.0, -1.0) * np.sign(signed_areas)
+    area = np.sum(weights * signed_areas)
+
+    outer_points = points[np.repeat(outer, sizes)]
+    bbox = (*outer_points.min(axis=0), *outer_points.max(axis=0))
+
+    if abs(area) < 1e-12:
+        # a degenerate polygon, like a line
+        return Shape(tuple(float(c) for c in outer_points.mean(axis=0)), tuple(float(b) for b in bbox), 0.0)
+
+    center = np.sum(weights * moments_x) / area, np.sum(weights * moments_y) / area
+
+    projected_x = x * np.cos(np.radians(y))
+    projected_next_x = next_x * np.cos(np.radians(next_y))
+    projected_areas = np.bincount(ring_ids, projected_x * next_y - projected_next_x * y) / 2
+    area_km2 = np.sum(np.where(outer, 1.0, -1.0) * np.abs(projected_areas)) * km_per_degree ** 2
+
+    return Shape(tuple(float(c) for c in center), tuple(float(b) for b in bbox), float(area_km2))
+
+def rings_hash(rings):
+    """A hash of the converted coordinates, which is much cheaper than serializing the GeoJSON"""
+    digest = hashlib.sha1()
+    for ring in rings:
+        digest.update(np.ascontiguousarray(ring).tobytes())
+        # rings are separated, so moving a vertex from one ring to the next changes the hash
+        digest.update(b'|')
+    return digest.digest()
+
+def get_shape(geo, key=None):
+    """
+    The center, bounding box and area of a GeoJSON Point, Polygon or MultiPolygon.
+    With a key (like the location's names), the result is reused until the geometry changes.
+    """
     if geo['type'] == 'Point':
-        return geo['coordinates']
-    elif geo['type'] == 'Polygon':
-        return get_poly_center(geo['coordinates'])
-    elif geo['type'] == 'MultiPolygon':
-        return get_poly_center(geo['coordinates'][0])
+        lng, lat = geo['coordinates'][:2]
+        return Shape((lng, lat), (lng, lat, lng, lat), 0.0)
+
+    rings, outer = get_rings(geo)
+    if key is None:
+        return rings_shape(rings, outer)
+
+    digest = rings_hash(rings), tuple(outer)
+    cached = shape_cache.get(key)
+    if cached and cached[0] == digest:
+        shape_cache.move_to_end(key)
+        return cached[1]
+
+    shape = rings_shape(rings, outer)
+    shape_cache[key] = digest, shape
+    shape_cache.move_to_end(key)
+    while len(shape_cache) > max_cached:
+        shape_cache.popitem(last=False)
+    return shape
+
+def get_center_long_lat(geo, key=None):
+    shape = get_shape(geo, key)
+    if shape is None:
+        return None, None
+    return shape.center
 
 def get_precision(lng, lat):
     import decimal
@@ -28,4 +120,4 @@ def get_precision(lng, lat):
     lat_d = decimal.Decimal(str(lat))
     lng_precision = -lng_d.as_tuple().exponent
     lat_precision = -lat_d.as_tuple().exponent
-    return min(lat_precision, lng_precision)
\ No newline at end of file
+    return min(lat_precision, lng_precision)
@@ -0,0 +1,69 @@
+"""
+Reads one table out of a scraped page.
+
+Most scrape sources only need a single table from a large page. Instead of
+building a tree for the whole page, the page is parsed with a SoupStrainer,
+so only the matching element (and what's inside it) becomes a tree. Rows
+come back as lists of cell texts.
+"""
+
+import re
+from collections import namedtuple
+from bs4 import BeautifulSoup, SoupStrainer
+
+# the texts of a row's cells, in order, and the <tr>'s attributes
+TableRow = namedtuple("TableRow", ["cells", "attrs"])
+
+# header cells and data cells
+all_cells = ["th", "td"]
+
+def parse_only(html, tag="table", **attrs):
+    """A tree of just the elements matching tag and attrs (like id="dataTable" or class_="num")"""
+    if 'class_' in attrs:
+        # while straining, class is still the raw attribute string, like "num table"
+        attrs['class'] = re.compile(r"(^|\s)" + re.escape(attrs.pop('class_')) + r"(\s|$)")
+    return BeautifulSoup(html, "lxml", parse_only=SoupStrainer(tag, attrs=attrs))
+
+def table_row(row, cells="td"):
+    return TableRow([cell.get_text() for cell in row.find_all(cells, recursive=False)], row.attrs)
+
+def table_rows(table, section="tbody", cells="td"):
+    """
+    The rows of a table's section (tbody by default, or the whole table if section
+    is None), with the texts of their cells ("td" by default, or a list like all_cells).
+    A table without the section has no rows.
+    """
+    container = table.find(section) if section else table
+    if container is None:
+        return
+    for row in container.find_all("tr"):
+        yield table_row(row, cells)
+
+def find_table(html, tag="table", **attrs):
+    """The first table inside (or equal to) the first element matching tag and attrs"""
+    table = parse_only(html, tag, **attrs).find("table")
+    if table is None:
+        raise ValueError(f"No table found in <{tag or '*'} {attrs}>")
+    return table
+
+def extract_table(html, section="tbody", tag="table", cells="td", **attrs):
+    """The rows of a table's section, like table_rows"""
+    return list(table_rows(find_table(html, tag, **attrs), section, cells))
+
+def header_row(table):
+    """The <tr> with a table's column names: the first row of its <thead>, or else its first row"""
+    return (table.find("thead") or table).find("tr")
+
+def header(table):
+    """The column names of a table"""
+    row = header_row(table)
+    return table_row(row, all_cells).cells if row else []
+
+def body_rows(table):
+    """The data rows of a table, with all of their cells: every row but the header row and the rest of the <thead>"""
+    head = table.find("thead")
+    first = header_row(table)
+    for row in table.find_all("tr"):
+        if row is first or (head is not None and head in row.parents):
+            continue
+        yield table_row(row, all_cells)
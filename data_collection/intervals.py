@@ -0,0 +1,202 @@
+"""
+Interval-encoded datapoint storage.
+
+Small provinces and counties often report the same numbers for days at a
+time. Instead of a row per location per day, datapoint_intervals stores one
+row per run of days with identical stats, valid from valid_from through
+valid_to (inclusive). A day that repeats the previous day's stats only
+moves valid_to forward.
+
+Uploads use this when the database is set to store intervals (corona_sql.interval_storage,
+from DATAPOINT_STORAGE=intervals). Readers don't see the difference: the
+datapoints view expands each interval back into one row per day (see
+partitioning.py), and recounting and rollups read the same rows.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from corona_sql import DatapointInterval, location_index, stat_labels
+import partitioning
+import recounting
+
+def iso(d):
+    if type(d) == date:
+        return d.isoformat()
+    else:
+        return d
+
+def to_date(date_str):
+    return datetime.strptime(date_str[:10], "%Y-%m-%d").date()
+
+def shift(date_str, days):
+    return (to_date(date_str) + timedelta(days=days)).isoformat()
+
+def same_stats(a, b):
+    return all((a.get(label) or 0) == (b.get(label) or 0) for label in stat_labels)
+
+class IntervalCache:
+    """The interval counterpart of caching.DatapointCache"""
+    def __init__(self, intervals, session, force_update=False):
+        self.by_location = defaultdict(list)
+        for interval in intervals:
+            self.by_location[interval.location_id].append(interval)
+
+        self.session = session
+        self.force_update = force_update
+        self.seen = set()
+        self.was_updated = False
+        self.potential_changes = set()
+        self.changed = set()
+
+    def find(self, location_id, entry_date):
+        for interval in self.by_location[location_id]:
+            if interval.valid_from <= entry_date <= interval.valid_to:
+                return interval
+
+    def find_ending(self, location_id, entry_date):
+        for interval in self.by_location[location_id]:
+            if interval.valid_to == entry_date:
+                return interval
+
+    def find_starting(self, location_id, entry_date):
+        for interval in self.by_location[location_id]:
+            if interval.valid_from == entry_date:
+                return interval
+
+    def add(self, location_id, valid_from, valid_to, stats):
+        interval = DatapointInterval(location_id=location_id, valid_from=valid_from, valid_to=valid_to, **stats)
+        self.session.add(interval)
+        self.by_location[location_id].append(interval)
+        return interval
+
+    def remove(self, interval):
+        self.by_location[interval.location_id].remove(interval)
+        if interval in self.session.new:
+            self.session.expunge(interval)
+        else:
+            self.session.delete(interval)
+            # the key may be reused by a new interval later in this upload
+            self.session.flush()
+
+    def move_start(self, interval, valid_from):
+        """Changes an interval's valid_from, which is part of its key"""
+        interval.valid_from = valid_from
+        if interval not in self.session.new:
+            # the old key may be reused by a new interval later in this upload
+            self.session.flush()
+
+    def coalesce(self, first, second):
+        """Merges two intervals if they're adjacent and have the same stats"""
+        if first and second and first.valid_to == shift(second.valid_from, -1) and same_stats(first.stats(), second.stats()):
+            first.valid_to = second.valid_to
+            self.remove(second)
+            return first
+        return second
+
+    def parents(self, location_id, entry_date):
+        for parent_id in location_index.ancestor_ids(self.session, location_id):
+            yield parent_id, entry_date
+
+    def recount_changes(self):
+        by_depth = lambda change: (location_index.depth(change[0]), change[1])
+        for location_id, entry_date in sorted(self.potential_changes, key=by_depth, reverse=True):
+            overall = recounting.sum_children(location_id, entry_date, self.session)
+            if overall:
+                self.update_data(overall)
+
+    def update_all(self, datapoint_datas):
+        for datapoint_data in datapoint_datas:
+            self.update_data(datapoint_data)
+
+    def update_data(self, datapoint_data):
+        location_id = datapoint_data['location_id']
+        entry_date = iso(datapoint_data['entry_date'])
+
+        t = location_id, entry_date
+        if t in self.seen:
+            return
+        else:
+            self.seen.add(t)
+
+        current = self.find(location_id, entry_date)
+        if current:
+            candidate = DatapointInterval(**current.stats())
+            if candidate.update(datapoint_data, requireIncreasing=not self.force_update):
+                self.split(current, entry_date, candidate.stats())
+                self.changed.add(t)
+            elif not self.force_update:
+                return
+        else:
+            stats = {label: datapoint_data.get(label) or 0 for label in stat_labels}
+            previous = self.find_ending(location_id, shift(entry_date, -1))
+            following = self.find_starting(location_id, shift(entry_date, 1))
+
+            if previous and same_stats(previous.stats(), stats):
+                previous.valid_to = entry_date
+                self.coalesce(previous, following)
+            elif following and same_stats(following.stats(), stats):
+                self.move_start(following, entry_date)
+            else:
+                self.add(location_id, entry_date, entry_date, stats)
+
+            self.changed.add(t)
+
+        self.potential_changes.update(self.parents(location_id, entry_date))
+        self.was_updated = True
+
+    def split(self, current, entry_date, stats):
+        """Gives entry_date its own stats, inside of an interval that covers it"""
+        old_stats = current.stats()
+        old_valid_to = current.valid_to
+
+        if current.valid_from < entry_date:
+            current.valid_to = shift(entry_date, -1)
+            middle = self.add(current.location_id, entry_date, entry_date, stats)
+        else:
+            for label, value in stats.items():
+                setattr(current, label, value)
+            current.valid_to = entry_date
+            current.update_time = datetime.utcnow()
+            middle = current
+
+        if old_valid_to > entry_date:
+            following = self.add(current.location_id, shift(entry_date, 1), old_valid_to, old_stats)
+        else:
+            following = self.find_starting(current.location_id, shift(entry_date, 1))
+
+        previous = self.find_ending(current.location_id, shift(entry_date, -1))
+        middle = self.coalesce(previous, middle)
+        self.coalesce(middle, following)
+
+    @staticmethod
+    def create(rows, session):
+        location_ids = set()
+
+        max_entry_date = min_entry_date = iso(rows[0]['entry_date'])
+
+        for row in rows:
+            location_ids.add(row['location_id'])
+
+            row_date = iso(row['entry_date'])
+            if row_date < min_entry_date:
+                min_entry_date = row_date
+            if row_date > max_entry_date:
+                max_entry_date = row_date
+
+        for location_id in list(location_ids):
+            location_ids.update(location_index.ancestor_ids(session, location_id))
+
+        # intervals that end the day before or start the day after can be extended
+        intervals = session.query(DatapointInterval).filter(
+            DatapointInterval.valid_from <= shift(max_entry_date, 1),
+            DatapointInterval.valid_to >= shift(min_entry_date, -1)
+        )
+
+        if len(location_ids) <= 1000:
+            intervals = intervals.filter(DatapointInterval.location_id.in_(list(location_ids)))
+
+        # the datapoints view only has the days that are in the calendar
+        partitioning.fill_calendar(session, to_date(min_entry_date), to_date(max_entry_date))
+
+        return IntervalCache(intervals, session)
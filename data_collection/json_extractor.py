@@ -1,6 +1,8 @@
 from datetime import date, timedelta, datetime
 import standards
 import traceback
+import functools
+import operator
 import sys
 
 def number(string):
@@ -28,6 +30,7 @@ json_methods = {
     "::dmy": lambda x: datetime.strptime(x, "%d%m%Y").date(),
     "::ymd": lambda x: datetime.strptime(x, "%Y%m%d").date(),
     "::date_t": date_t,
+    "::iso_date": lambda x: datetime.strptime(x[:10], "%Y-%m-%d").date(),
     "::us_state_code": standards.state_codes['United States'].get,
     "::str": lambda x: str(x),
     "::dividethousands": lambda x: x/1000,
@@ -48,13 +51,70 @@ def find_json(head, selectors):
         sys.stderr.write("KeyError warning on {} for selectors {}".format(e, selectors))
         traceback.print_tb(e.__traceback__)
 
+def compile_selectors(selectors):
+    """Turns a selector list into a function of the row. Anything that isn't a list is a constant."""
+    if type(selectors) != list:
+        return lambda head: selectors
+
+    steps = []
+    for selector in selectors:
+        if type(selector) == str and selector.startswith("::"):
+            steps.append(json_methods[selector])
+        else:
+            steps.append(operator.itemgetter(selector))
+
+    if len(steps) == 1:
+        return steps[0]
+
+    def extract(head):
+        for step in steps:
+            head = step(head)
+        return head
+
+    return extract
+
+def compile_labels_uncached(labels):
+    constants = {label: value for label, value in labels.items() if type(value) != list and value is not None}
+    fields = [(label, compile_selectors(selectors), selectors) for label, selectors in labels.items() if type(selectors) == list]
+
+    def extract_row(row):
+        result = dict(constants)
+        for label, extract, selectors in fields:
+            try:
+                value = extract(row)
+            except KeyError as e:
+                sys.stderr.write("KeyError warning on {} for selectors {}".format(e, selectors))
+                traceback.print_tb(e.__traceback__)
+                continue
+
+            if value is not None:
+                result[label] = value
+
+        return result
+
+    return extract_row
+
+class FrozenSelectors(tuple):
+    """A hashable selector list, told apart from constants that happen to be tuples"""
+
+@functools.lru_cache(maxsize=256)
+def compile_frozen_labels(frozen_labels):
+    return compile_labels_uncached({label: list(value) if type(value) == FrozenSelectors else value for label, value in frozen_labels})
+
+def compile_labels(labels):
+    """
+    Compiles a source's table labels into a function that extracts a row.
+    The compiled labels are cached, so a source is only compiled once per process.
+    """
+    frozen_labels = tuple((label, FrozenSelectors(value) if type(value) == list else value) for label, value in labels.items())
+    try:
+        return compile_frozen_labels(frozen_labels)
+    except TypeError:
+        # an unhashable constant
+        return compile_labels_uncached(labels)
+
 def extract_json_row(row, labels):
-    result = {}
-    for label in labels:
-        j = find_json(row, labels[label])
-        if j is not None:
-            result[label] = j
-    return result
+    return compile_labels(labels)(row)
 
 def column_total(rows, column, start=0, converter=int):
     for row in rows:
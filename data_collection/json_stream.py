@@ -0,0 +1,118 @@
+"""
+Incremental parsing of large JSON responses.
+
+Sources like ArcGIS GeoJSON (with geometry) or the covidtracking history are
+several megabytes, but only the elements of one array in them are used.
+iter_json_array walks down to that array in the response stream and decodes
+its elements one at a time with json.JSONDecoder.raw_decode, so only the
+current element is held in memory instead of the whole document.
+"""
+
+import codecs
+import json
+import requests
+
+chunk_size = 1 << 16
+
+decoder = json.JSONDecoder()
+whitespace = " \t\n\r"
+delimiters = tuple(whitespace + ",]}")
+
+class JSONStream:
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = ""
+        self.pos = 0
+        self.exhausted = False
+
+    def more(self):
+        """Reads another chunk into the buffer. Returns False at the end of the stream."""
+        for chunk in self.chunks:
+            if chunk:
+                # drop what has already been parsed
+                self.buffer = self.buffer[self.pos:] + chunk
+                self.pos = 0
+                return True
+
+        self.exhausted = True
+        return False
+
+    def peek(self):
+        """The next non-whitespace character, or '' at the end of the stream"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in whitespace:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.more():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in JSON stream, found {found!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decodes the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+                # a number is only complete once something that can't be part of it follows
+                if self.exhausted or type(value) not in (int, float) or self.buffer[end:end + 1] in delimiters:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.exhausted:
+                    raise
+
+            self.more()
+
+    def find(self, key):
+        """Moves to the value of key in the object that starts here"""
+        self.expect('{')
+        while self.peek() != '}':
+            name = self.value()
+            self.expect(':')
+            if name == key:
+                return
+
+            self.value()
+            if self.peek() == ',':
+                self.pos += 1
+
+        raise KeyError(key)
+
+    def elements(self):
+        """Yields each element of the array that starts here. Anything other than an array is yielded as a single element."""
+        if self.peek() != '[':
+            yield self.value()
+            return
+
+        self.pos += 1
+        while self.peek() != ']':
+            yield self.value()
+            if self.peek() == ',':
+                self.pos += 1
+
+def decode_chunks(byte_chunks, encoding="utf-8"):
+    incremental = codecs.getincrementaldecoder(encoding)()
+    for chunk in byte_chunks:
+        yield incremental.decode(chunk)
+    yield incremental.decode(b"", final=True)
+
+def can_stream(path):
+    return all(type(key) == str and not key.startswith("::") for key in path)
+
+def iter_json_array(text_chunks, path=['features']):
+    """Yields the elements of the array found by following path (a list of object keys) in a chunked JSON document"""
+    stream = JSONStream(text_chunks)
+    for key in path:
+        stream.find(key)
+    yield from stream.elements()
+
+def iter_json_url(url, path=['features'], timeout=10):
+    response = requests.get(url, timeout=timeout, stream=True)
+    with response:
+        yield from iter_json_array(decode_chunks(response.iter_content(chunk_size), response.encoding or "utf-8"), path)
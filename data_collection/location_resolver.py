@@ -0,0 +1,142 @@
+"""
+Matches location names that haven't been seen before to known locations.
+
+Sources spell the same place in different ways ("Korea, South" and "South
+Korea", "São Paulo" and "Sao Paulo", "Concelho" and "concelho"). Instead of
+creating a duplicate location for each variant, an unseen name is compared
+with the names already known under the same parent (countries with countries,
+a country's provinces with each other, and so on):
+
+- names are folded first (accents removed, case and punctuation ignored,
+  words sorted), and a unique exact match of the folded names scores 1
+- otherwise the closest name by character trigrams (Dice coefficient) is
+  found through an inverted index, so only names sharing a trigram are scored
+
+A match is used when it scores at least the threshold. See LocationIndex.get_id,
+which records every match (and every near miss) in the location_matches table.
+"""
+
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+
+# matches below this aren't used
+default_threshold = 0.9
+
+# near misses at or above this are still logged, so they can be reviewed
+review_threshold = 0.6
+
+# one level of a resolved name: the name as given, the known name it matched, and how well
+Match = namedtuple("Match", ["level", "name", "matched_name", "score", "accepted"])
+
+def fold(name):
+    """The name without accents, case, punctuation or word order"""
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    return ' '.join(sorted(re.findall(r"\w+", name.casefold())))
+
+def trigrams(key):
+    padded = f" {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class Scope:
+    """The names of the locations under one parent"""
+    def __init__(self):
+        self.names = set()
+        # folded name -> names
+        self.keys = defaultdict(set)
+        # trigram -> names, and name -> its trigrams
+        self.postings = defaultdict(set)
+        self.grams = {}
+
+    def add(self, name):
+        if name in self.names:
+            return
+        self.names.add(name)
+        key = fold(name)
+        self.keys[key].add(name)
+        self.grams[name] = trigrams(key)
+        for gram in self.grams[name]:
+            self.postings[gram].add(name)
+
+    def remove(self, name):
+        if name not in self.names:
+            return
+        self.names.discard(name)
+        self.keys[fold(name)].discard(name)
+        for gram in self.grams.pop(name):
+            self.postings[gram].discard(name)
+
+    def best_match(self, name):
+        """The closest known name and its score, or (None, 0) if there's no clear best"""
+        key = fold(name)
+        exact = self.keys.get(key)
+        if exact:
+            # two known names that fold the same way are ambiguous
+            return (next(iter(exact)), 1.0) if len(exact) == 1 else (None, 0)
+
+        grams = trigrams(key)
+        shared = defaultdict(int)
+        for gram in grams:
+            for candidate in self.postings.get(gram, ()):
+                shared[candidate] += 1
+
+        best, best_score, tied = None, 0, False
+        for candidate, count in shared.items():
+            score = 2 * count / (len(grams) + len(self.grams[candidate]))
+            if score > best_score:
+                best, best_score, tied = candidate, score, False
+            elif score == best_score:
+                tied = True
+
+        return (None, 0) if tied else (best, best_score)
+
+class Resolver:
+    """Known location names, indexed by their parent (country, province) names"""
+    def __init__(self, threshold=default_threshold):
+        self.threshold = threshold
+        self.scopes = defaultdict(Scope)
+
+    @staticmethod
+    def levels(t):
+        """(parent names, name) of each named level of a (country, province, county)"""
+        return [(t[:i], t[i]) for i in range(3) if t[i]]
+
+    def add(self, t):
+        for parent, name in self.levels(t):
+            self.scopes[parent].add(name)
+
+    def remove(self, t):
+        # only the lowest level is removed, since the parents may still have other children
+        levels = self.levels(t)
+        if levels:
+            parent, name = levels[-1]
+            self.scopes[parent].remove(name)
+
+    def resolve(self, t):
+        """
+        The known names that t most likely refers to, level by level, and the
+        matches that were tried. Levels that are already known, or that don't
+        match anything well enough, are kept as they are.
+        """
+        resolved = list(t)
+        matches = []
+        for i in range(3):
+            name = t[i]
+            if not name:
+                continue
+
+            scope = self.scopes.get(tuple(resolved[:i]))
+            if scope is None or name in scope.names:
+                continue
+
+            matched_name, score = scope.best_match(name)
+            if matched_name is None or score < review_threshold:
+                continue
+
+            accepted = score >= self.threshold
+            matches.append(Match(i, name, matched_name, score, accepted))
+            if accepted:
+                resolved[i] = matched_name
+
+        return tuple(resolved), matches
@@ -0,0 +1,48 @@
+from corona_sql import engine, Session, Datapoint, location_index, stat_labels, try_commit
+import standards
+import partitioning
+
+"""
+
+Adds continent rows to an existing MySQL database. The group column is
+filled in on every datapoint, each continent gets a location, and its
+history is summed from the country-level rows. After this, uploads keep
+the continent rows up to date.
+
+"""
+def add_location_groups():
+    with engine.begin() as conn:
+        print("Adding group to locations...")
+        conn.execute("""
+            alter table locations
+                add column `group` varchar(320) default '' after county,
+                drop key location_names,
+                add unique key location_names (country, province, county, `group`)
+        """)
+
+    session = Session()
+    countries = [country for country, in session.query(Datapoint.country).distinct() if country]
+    groups = {country: standards.group_of(country) for country in countries}
+    group_ids = {group: location_index.get_group_id(session, group) for group in set(groups.values()) if group}
+    try_commit(session)
+
+    sums = ", ".join(f"sum({label})" for label in stat_labels)
+    with engine.begin() as conn:
+        for table in ['datapoints_live', 'datapoints_archive']:
+            print("Filling in groups on", table)
+            for country, group in groups.items():
+                conn.execute(f"update {table} set `group` = %s where country = %s", (group, country))
+
+            for group, location_id in group_ids.items():
+                print("Summing", group, "in", table)
+                conn.execute(f"""
+                    replace into {table} (location_id, entry_date, country, province, county, `group`, {", ".join(stat_labels)})
+                    select %s, entry_date, '', '', '', %s, {sums} from {table}
+                    where `group` = %s and country <> '' and province = '' and county = ''
+                    group by entry_date
+                """, (location_id, group, group))
+
+    partitioning.create_history_view(engine)
+
+if __name__ == "__main__":
+    add_location_groups()
@@ -0,0 +1,52 @@
+from corona_sql import engine, Location, Session
+import standards
+import partitioning
+
+"""
+
+Moves an existing MySQL database over to integer location_ids.
+Every (country, province, county) in datapoints gets a row in locations,
+and datapoints are re-keyed by (location_id, entry_date).
+
+"""
+def add_location_ids():
+    with engine.begin() as conn:
+        print("Adding location_id to locations...")
+        conn.execute("""
+            alter table locations
+                drop primary key,
+                add column location_id int auto_increment primary key first,
+                add column country_code char(2) after county,
+                add column fips varchar(5) after country_code,
+                add unique key location_names (country, province, county),
+                add unique key (fips),
+                add key (country_code)
+        """)
+
+        for table in ['datapoints_live', 'datapoints_archive']:
+            print("Adding locations from", table)
+            conn.execute(f"""
+                insert ignore into locations (country, province, county)
+                select distinct country, province, county from {table}
+            """)
+
+        for table in ['datapoints_live', 'datapoints_archive']:
+            print("Re-keying", table)
+            conn.execute(f"alter table {table} add column location_id int not null default 0 first")
+            conn.execute(f"""
+                update {table} d join locations l on
+                    l.country = d.country and l.province = d.province and l.county = d.county
+                set d.location_id = l.location_id
+            """)
+            conn.execute(f"alter table {table} drop primary key, add primary key (location_id, entry_date), add key location_names (country, province, county, entry_date)")
+
+    print("Adding country codes...")
+    session = Session()
+    for location in session.query(Location):
+        location.country_code = standards.country_codes_reverse.get(location.country)
+    session.commit()
+
+    partitioning.create_history_view(engine)
+
+if __name__ == "__main__":
+    add_location_ids()
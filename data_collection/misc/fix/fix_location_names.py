@@ -1,42 +1,236 @@
+from sqlalchemy import MetaData, Table, Column, Integer, String, bindparam, text
+
 from corona_sql import *
+import rollups
+
+"""
+
+Renames locations whose names aren't normalized any more (after aliases are
+added, for example), and merges them into the location with the normalized
+names when there already is one.
+
+Only the distinct names in the locations table are normalized. The renames
+are written to a staging table, and each batch is applied with a few joined
+statements in one transaction:
+- datapoints of merged locations are combined with each other and with the
+  target's datapoints for the same day (keeping the larger of each stat), or
+  moved to the target
+- mobility and interval rows are moved too, unless the target (or another
+  merged location) already has them
+- freshness, capacity and rollups of merged locations are dropped, and the
+  targets' rollups are recalculated
+
+"""
+batch_size = 500
+
+location_renames = Table(
+    "location_renames", MetaData(),
+    Column("old_id", Integer, primary_key=True),
+    Column("new_id", Integer, index=True),
+    Column("country", String(256)),
+    Column("province", String(256)),
+    Column("county", String(256)),
+    # the group (continent) of the new country, which datapoints are also labelled with
+    Column("group", String(320))
+)
+
+merged = "(select old_id from location_renames where old_id <> new_id)"
+
+def rename_map(session):
+    """old location_id -> the location_id and names that it should have"""
+    locations = session.query(Location.location_id, Location.country, Location.province, Location.county).filter(Location.group == '').order_by(Location.location_id).all()
+    ids = {(country, province, county): location_id for location_id, country, province, county in locations}
+
+    # names that no location has yet go to the first location that's renamed to them
+    targets = {}
+    renames = {}
+    for location_id, country, province, county in locations:
+        names = country, province, county
+        normalized = standards.normalize_name(*names)
+        if normalized != names:
+            new_id = ids.get(normalized) or targets.setdefault(normalized, location_id)
+            renames[location_id] = new_id, normalized
+    return renames
+
+def is_mysql():
+    return engine.dialect.name == 'mysql'
+
+def larger(label):
+    return f"case when o.{label} > t.{label} or t.{label} is null then o.{label} else t.{label} end"
+
+def merge_stats(conn, table):
+    """Keeps the larger of each stat where a merged location and its target have the same day"""
+    if is_mysql():
+        conn.execute(f"""
+            update {table} t
+                join location_renames r on t.location_id = r.new_id
+                join {table} o on o.location_id = r.old_id and o.entry_date = t.entry_date
+            set {", ".join(f"t.{label} = {larger(label)}" for label in stat_labels)}
+            where r.old_id <> r.new_id
+        """)
+    else:
+        conn.execute(f"""
+            update {table} as t
+            set {", ".join(f"{label} = {larger(label)}" for label in stat_labels)}
+            from location_renames r join {table} o on o.location_id = r.old_id
+            where t.location_id = r.new_id and o.entry_date = t.entry_date and r.old_id <> r.new_id
+        """)
+
+def collapse_sources(conn, table, date_column, labels=()):
+    """
+    Where several merged locations have the same day (and the target doesn't have to), keeps
+    the row of the first one, with the largest of each of labels, and deletes the others
+    """
+    if labels:
+        sums = ", ".join(f"max(o.{label}) as {label}" for label in labels)
+        duplicates = f"""
+            select r.new_id, o.{date_column}, min(o.location_id) as keep_id, {sums}
+            from {table} o join location_renames r on o.location_id = r.old_id
+            where r.old_id <> r.new_id
+            group by r.new_id, o.{date_column}
+            having count(*) > 1
+        """
+        if is_mysql():
+            conn.execute(f"""
+                update {table} t join ({duplicates}) m on t.location_id = m.keep_id and t.{date_column} = m.{date_column}
+                set {", ".join(f"t.{label} = m.{label}" for label in labels)}
+            """)
+        else:
+            conn.execute(f"""
+                update {table} set {", ".join(f"{label} = m.{label}" for label in labels)}
+                from ({duplicates}) m where {table}.location_id = m.keep_id and {table}.{date_column} = m.{date_column}
+            """)
+
+    # the rows of a merged location that an earlier merged location (with the same target) also has
+    if is_mysql():
+        conn.execute(f"""
+            delete o from {table} o
+                join location_renames r on o.location_id = r.old_id
+                join location_renames rk on rk.new_id = r.new_id
+                join {table} k on k.location_id = rk.old_id and k.{date_column} = o.{date_column}
+            where r.old_id <> r.new_id and rk.old_id <> rk.new_id and k.location_id < o.location_id
+        """)
+    else:
+        conn.execute(f"""
+            delete from {table} where exists (
+                select 1 from location_renames r
+                    join location_renames rk on rk.new_id = r.new_id
+                    join {table} k on k.location_id = rk.old_id
+                where r.old_id = {table}.location_id and r.old_id <> r.new_id and rk.old_id <> rk.new_id
+                    and k.{date_column} = {table}.{date_column} and k.location_id < {table}.location_id
+            )
+        """)
+
+def drop_conflicts(conn, table, date_column):
+    """Deletes the merged locations' rows for days that the target already has"""
+    if is_mysql():
+        conn.execute(f"""
+            delete o from {table} o
+                join location_renames r on o.location_id = r.old_id
+                join {table} t on t.location_id = r.new_id and t.{date_column} = o.{date_column}
+            where r.old_id <> r.new_id
+        """)
+    else:
+        conn.execute(f"""
+            delete from {table} where exists (
+                select 1 from location_renames r join {table} t on t.location_id = r.new_id
+                where r.old_id = {table}.location_id and r.old_id <> r.new_id and t.{date_column} = {table}.{date_column}
+            )
+        """)
+
+def move_rows(conn, table, names=True):
+    """Moves the rows of renamed locations to their new location_id (and names, including the group of a new country)"""
+    assignments = ["location_id = r.new_id"]
+    if names:
+        group = engine.dialect.identifier_preparer.quote("group")
+        assignments += ["country = r.country", "province = r.province", "county = r.county", f"{group} = r.{group}"]
+
+    if is_mysql():
+        conn.execute(f"update {table} o join location_renames r on o.location_id = r.old_id set {', '.join('o.' + a for a in assignments)}")
+    else:
+        conn.execute(f"update {table} set {', '.join(assignments)} from location_renames r where {table}.location_id = r.old_id")
+
+def apply_renames(conn, rows):
+    conn.execute(location_renames.delete())
+    conn.execute(location_renames.insert(), rows)
+
+    # the target days whose stats might change, for the rollups
+    changed = set()
+    for table in [Datapoint.__tablename__, datapoints_archive.name]:
+        changed.update(tuple(row) for row in conn.execute(f"""
+            select r.new_id, o.entry_date from {table} o join location_renames r on o.location_id = r.old_id
+            where r.old_id <> r.new_id
+        """).fetchall())
+
+        collapse_sources(conn, table, "entry_date", stat_labels)
+        merge_stats(conn, table)
+        drop_conflicts(conn, table, "entry_date")
+        move_rows(conn, table)
+
+    collapse_sources(conn, Mobility.__tablename__, "entry_date")
+    drop_conflicts(conn, Mobility.__tablename__, "entry_date")
+    move_rows(conn, Mobility.__tablename__, names=False)
+
+    # intervals can't be combined, so a target with its own intervals keeps just those,
+    # and otherwise only the first merged location with intervals is moved to it
+    location_ids = {row['new_id'] for row in rows} | {row['old_id'] for row in rows}
+    with_intervals = {location_id for location_id, in conn.execute(
+        text("select distinct location_id from datapoint_intervals where location_id in :ids").bindparams(bindparam("ids", expanding=True)),
+        ids=list(location_ids)
+    )}
+    replaced = []
+    kept = {}
+    for row in sorted(rows, key=lambda row: row['old_id']):
+        if row['old_id'] == row['new_id'] or row['old_id'] not in with_intervals:
+            continue
+        if row['new_id'] in with_intervals or kept.setdefault(row['new_id'], row['old_id']) != row['old_id']:
+            replaced.append(row['old_id'])
+    if replaced:
+        conn.execute(text("delete from datapoint_intervals where location_id in :ids").bindparams(bindparam("ids", expanding=True)), ids=replaced)
+    move_rows(conn, DatapointInterval.__tablename__, names=False)
+
+    for table in [LocationFreshness.__tablename__, LocationCapacity.__tablename__, WeeklyRollup.__tablename__, MonthlyRollup.__tablename__]:
+        conn.execute(f"delete from {table} where location_id in {merged}")
+
+    conn.execute(f"delete from locations where location_id in {merged}")
+    if is_mysql():
+        conn.execute("update locations l join location_renames r on l.location_id = r.old_id set l.country = r.country, l.province = r.province, l.county = r.county")
+    else:
+        conn.execute("update locations set country = r.country, province = r.province, county = r.county from location_renames r where locations.location_id = r.old_id")
+
+    conn.execute(location_renames.delete())
+    return changed
 
 def fix_location_names():
     print("Fixing location names...")
     session = Session()
-    all_countries = session.query(Datapoint)
-    for row in all_countries:
-        session = Session()
-        country, province, county, entry_date = row.country, row.province, row.county, row.entry_date
+    renames = rename_map(session)
+    session.close()
 
-        # normalize the name
-        new_country, new_province, new_county = standards.normalize_name(country, province, county)
+    merges = sum(1 for old_id, (new_id, _) in renames.items() if old_id != new_id)
+    print(f"Renaming {len(renames) - merges} locations and merging {merges} into others")
+    if not renames:
+        return
 
-        # see if the normalized name is different
-        if new_country == country and new_province == province and new_county == county:
-            continue
-        else:
-            print(country, province, county, entry_date, "-->", new_country, new_province, new_county)
-
-        # check if an entry with the fixed name already exists
-        real_name = session.query(Datapoint).filter_by(country=new_country, province=new_province, county=new_county, entry_date=entry_date).first()
-        old_name = row
-
-        if real_name:
-            print("Found a duplicate")
-            # update the row that has the real name, and remove the row with the fake name
-            for label in ['total', 'deaths', 'recovered', 'tests', 'serious']:
-                if getattr(old_name, label) > getattr(real_name, label):
-                    setattr(real_name, label, getattr(old_name, label))
-                    
-            session.delete(old_name)
-        else:
-            print("Found no duplicates")
-            # update the row with the fake name to have the correct name
-            old_name.country = new_country
-            old_name.province = new_province
-            old_name.county = new_county
-            
-    session.commit()
+    rows = [
+        {"old_id": old_id, "new_id": new_id, "country": country, "province": province, "county": county, "group": standards.group_of(country)}
+        for old_id, (new_id, (country, province, county)) in renames.items()
+    ]
+
+    location_renames.create(engine, checkfirst=True)
+    changed = set()
+    try:
+        for i in range(0, len(rows), batch_size):
+            with engine.begin() as conn:
+                changed.update(apply_renames(conn, rows[i:i + batch_size]))
+            print(f"\r{min(i + batch_size, len(rows))}/{len(rows)}", end='\r')
+    finally:
+        location_renames.drop(engine)
+
+    print("Updating rollups...")
+    session = Session()
+    rollups.update_rollups(session, changed)
+    try_commit(session)
 
 # this is like a CS lab
 def remove_duplicates():
@@ -68,4 +262,5 @@ def remove_duplicates():
     print("Committing...")
     session.commit()
 
-# fix_location_names()
\ No newline at end of file
+if __name__ == "__main__":
+    fix_location_names()
\ No newline at end of file
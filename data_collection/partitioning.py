@@ -0,0 +1,258 @@
+"""
+Usage: partitioning.py [--install] [--months-ahead <n>] [--keep-months <n>]
+
+--install               Moves an existing datapoints table into the live/archive layout.
+--months-ahead <n>      Monthly partitions to create ahead of today [default: 3].
+--keep-months <n>       Full months to keep in the live table [default: 3].
+
+Live cycles only touch recent dates, so datapoints are kept in two tables:
+datapoints_live, which the collector writes to, and datapoints_archive,
+which holds old months in compact storage. Readers keep querying
+`datapoints`, which is a view over both of them. Continent totals are kept
+out of it, in the `group_datapoints` view.
+
+When the database stores intervals instead (DATAPOINT_STORAGE=intervals, see
+intervals.py), the views expand each interval into one row per day, using the
+calendar_days table. This also fills calendar_days up to --months-ahead.
+
+On MySQL, datapoints_live is range-partitioned by month on entry_date, so
+archiving a month is a copy followed by DROP PARTITION. Other backends (like
+the sqlite snapshot) move the rows month by month instead.
+
+Run this once a month (or more), so that there is always a partition
+ready for the coming months.
+"""
+
+from sqlalchemy import inspect, select, exists, union_all, and_, func, text
+from datetime import date, timedelta
+
+import corona_sql
+from corona_sql import Base, Datapoint, DatapointInterval, Location, datapoints_archive, calendar_days, engine
+
+live_table = Datapoint.__table__
+archive_table = datapoints_archive
+interval_table = DatapointInterval.__table__
+location_table = Location.__table__
+
+def is_mysql(engine):
+    return engine.dialect.name == 'mysql'
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+def add_months(d: date, months: int) -> date:
+    month_index = d.year * 12 + d.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+def partition_name(d: date) -> str:
+    return d.strftime("p%Y_%m")
+
+def partition_clause(d: date) -> str:
+    return f"PARTITION {partition_name(d)} VALUES LESS THAN ('{add_months(d, 1).isoformat()}')"
+
+def column_list(table):
+    return ", ".join(engine.dialect.identifier_preparer.quote(column.name) for column in table.columns)
+
+def is_group_row(table):
+    return and_(table.c.country == '', func.coalesce(table.c.group, '') != '')
+
+def history_select(columns, where=None):
+    """
+    Rows of both tables, for the given columns. Rows that are in both tables
+    (a re-imported archived month) come from the live table. where is a function
+    of a table that returns the condition to filter each table's rows on.
+    """
+    keys = [column.name for column in live_table.primary_key]
+
+    in_live = exists().where(and_(*[live_table.c[key] == archive_table.c[key] for key in keys]))
+    live = select([live_table.c[column] for column in columns])
+    archived = select([archive_table.c[column] for column in columns]).where(~in_live)
+    if where is not None:
+        live = live.where(where(live_table))
+        archived = archived.where(where(archive_table))
+
+    return union_all(live, archived)
+
+def interval_days():
+    """
+    One row per day of each interval, with the columns of datapoints_live. The
+    names come from the locations table, so only continent rows have a group.
+    """
+    sources = {
+        'entry_date': calendar_days.c.entry_date,
+        **{label: location_table.c[label] for label in ['country', 'province', 'county', 'group']}
+    }
+    columns = [sources.get(column.name, interval_table.c.get(column.name)).label(column.name) for column in live_table.columns]
+    days = interval_table.join(calendar_days, calendar_days.c.entry_date.between(interval_table.c.valid_from, interval_table.c.valid_to)).join(location_table, location_table.c.location_id == interval_table.c.location_id)
+    return select(columns).select_from(days).alias("interval_days")
+
+def stored_select(columns, where=None):
+    """history_select, or the interval_days of the same columns when the database stores intervals"""
+    if not corona_sql.interval_storage:
+        return history_select(columns, where)
+
+    days = interval_days()
+    query = select([days.c[column] for column in columns])
+    if where is not None:
+        query = query.where(where(days))
+    return query
+
+def history_view_sql(engine, groups=False):
+    """The datapoints view, or with groups=True, the group_datapoints view of the continent rows"""
+    columns = [column.name for column in live_table.columns]
+
+    def included(table):
+        return is_group_row(table) if groups else ~is_group_row(table)
+
+    return str(stored_select(columns, included).compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+
+history_views = {'datapoints': False, 'group_datapoints': True}
+
+def create_history_view(engine):
+    with engine.begin() as conn:
+        for view, groups in history_views.items():
+            if is_mysql(engine):
+                conn.execute(text(f"CREATE OR REPLACE VIEW {view} AS " + history_view_sql(engine, groups)))
+            else:
+                conn.execute(text(f"DROP VIEW IF EXISTS {view}"))
+                conn.execute(text(f"CREATE VIEW {view} AS " + history_view_sql(engine, groups)))
+
+def fill_calendar(conn, first_day=None, last_day=None, months_ahead=3):
+    """
+    Adds the days between first_day and last_day that calendar_days is missing. By
+    default, from the first interval through the end of the month months_ahead.
+    conn can be a connection or a session.
+    """
+    if first_day is None:
+        first_date = conn.execute(select([func.min(interval_table.c.valid_from)])).scalar()
+        first_day = date.fromisoformat(first_date[:10]) if first_date else date.today()
+    if last_day is None:
+        last_day = add_months(month_start(date.today()), months_ahead + 1) - timedelta(days=1)
+
+    existing = {row[0] for row in conn.execute(select([calendar_days.c.entry_date]).where(calendar_days.c.entry_date.between(first_day.isoformat(), last_day.isoformat())))}
+    days = []
+    day = first_day
+    while day <= last_day:
+        if day.isoformat() not in existing:
+            days.append({"entry_date": day.isoformat()})
+        day += timedelta(days=1)
+
+    if days:
+        conn.execute(calendar_days.insert(), days)
+
+def existing_partitions(conn):
+    """Returns the (name, upper bound) of each partition of datapoints_live, in order"""
+    rows = conn.execute(text(
+        "SELECT partition_name, partition_description FROM information_schema.partitions "
+        "WHERE table_schema = DATABASE() AND table_name = 'datapoints_live' AND partition_name IS NOT NULL "
+        "ORDER BY partition_ordinal_position"
+    ))
+    return [(name, bound.strip("'")) for name, bound in rows]
+
+def partition_live_table(conn, months_ahead):
+    first_date = conn.execute(text("SELECT MIN(entry_date) FROM datapoints_live")).scalar()
+    first_month = month_start(date.fromisoformat(first_date[:10])) if first_date else month_start(date.today())
+    last_month = add_months(month_start(date.today()), months_ahead)
+
+    partitions = []
+    month = first_month
+    while month <= last_month:
+        partitions.append(partition_clause(month))
+        month = add_months(month, 1)
+
+    partitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    conn.execute(text("ALTER TABLE datapoints_live PARTITION BY RANGE COLUMNS(entry_date) (" + ", ".join(partitions) + ")"))
+
+def install(engine, months_ahead=3):
+    inspector = inspect(engine)
+    tables = inspector.get_table_names()
+
+    with engine.begin() as conn:
+        if 'datapoints' in tables and 'datapoints_live' not in tables:
+            print("Renaming datapoints to datapoints_live")
+            if is_mysql(engine):
+                conn.execute(text("RENAME TABLE datapoints TO datapoints_live"))
+            else:
+                conn.execute(text("ALTER TABLE datapoints RENAME TO datapoints_live"))
+
+    Base.metadata.create_all(engine, tables=[live_table, archive_table, interval_table, calendar_days])
+
+    if is_mysql(engine):
+        with engine.begin() as conn:
+            if not existing_partitions(conn):
+                print("Partitioning datapoints_live by month")
+                partition_live_table(conn, months_ahead)
+            conn.execute(text("ALTER TABLE datapoints_archive ROW_FORMAT=COMPRESSED"))
+
+    if corona_sql.interval_storage:
+        with engine.begin() as conn:
+            fill_calendar(conn, months_ahead=months_ahead)
+    create_history_view(engine)
+
+def create_future_partitions(engine, months_ahead=3):
+    if not is_mysql(engine):
+        return
+
+    last_month = add_months(month_start(date.today()), months_ahead)
+    with engine.begin() as conn:
+        bounds = [bound for name, bound in existing_partitions(conn) if name != 'pmax']
+        if not bounds:
+            return
+
+        # the first month that doesn't have a partition yet
+        month = date.fromisoformat(bounds[-1])
+        months = []
+        while month <= last_month:
+            months.append(month)
+            month = add_months(month, 1)
+
+        if months:
+            print("Creating partitions", ", ".join(partition_name(month) for month in months))
+            partitions = [partition_clause(month) for month in months]
+            partitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+            conn.execute(text("ALTER TABLE datapoints_live REORGANIZE PARTITION pmax INTO (" + ", ".join(partitions) + ")"))
+
+def archive_old_months(engine, keep_months=3):
+    cutoff = add_months(month_start(date.today()), -keep_months).isoformat()
+    columns = column_list(live_table)
+
+    if is_mysql(engine):
+        with engine.connect() as conn:
+            old_partitions = [name for name, bound in existing_partitions(conn) if name != 'pmax' and bound <= cutoff]
+
+        for name in old_partitions:
+            print("Archiving partition", name)
+            with engine.begin() as conn:
+                conn.execute(text(f"REPLACE INTO datapoints_archive ({columns}) SELECT {columns} FROM datapoints_live PARTITION ({name})"))
+                conn.execute(text(f"ALTER TABLE datapoints_live DROP PARTITION {name}"))
+    else:
+        with engine.connect() as conn:
+            months = [row[0] for row in conn.execute(
+                text("SELECT DISTINCT substr(entry_date, 1, 7) FROM datapoints_live WHERE entry_date < :cutoff ORDER BY 1"),
+                cutoff=cutoff
+            )]
+
+        for month in months:
+            print("Archiving month", month)
+            start = date.fromisoformat(month + "-01")
+            bounds = {"start": start.isoformat(), "end": min(add_months(start, 1).isoformat(), cutoff)}
+            with engine.begin() as conn:
+                conn.execute(text(f"INSERT OR REPLACE INTO datapoints_archive ({columns}) SELECT {columns} FROM datapoints_live WHERE entry_date >= :start AND entry_date < :end"), **bounds)
+                conn.execute(text("DELETE FROM datapoints_live WHERE entry_date >= :start AND entry_date < :end"), **bounds)
+
+if __name__ == "__main__":
+    import docopt
+
+    args = docopt.docopt(__doc__)
+    months_ahead = int(args['--months-ahead'])
+    keep_months = int(args['--keep-months'])
+
+    if args['--install']:
+        install(engine, months_ahead)
+
+    create_future_partitions(engine, months_ahead)
+    archive_old_months(engine, keep_months)
+    if corona_sql.interval_storage:
+        Base.metadata.create_all(engine, tables=[interval_table, calendar_days])
+        with engine.begin() as conn:
+            fill_calendar(conn, months_ahead=months_ahead)
@@ -0,0 +1,67 @@
+"""
+Text extraction for sources that publish PDF reports.
+
+Reports are usually unchanged from one cycle to the next, so the tokens
+extracted from a PDF are cached by the hash of its content, and only the
+pages a source asks for are extracted. Downloads are conditional (ETag /
+Last-Modified), so an unchanged report isn't downloaded again either.
+"""
+
+import hashlib
+import re
+from collections import OrderedDict
+from io import BytesIO
+
+import requests
+
+# reports kept in memory
+max_cached = 16
+
+# (content hash, pages) -> tokens
+token_cache = OrderedDict()
+
+# url -> (etag, last modified, content hash)
+validators = {}
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha1(content).hexdigest()
+
+def remember(key, tokens):
+    token_cache[key] = tokens
+    while len(token_cache) > max_cached:
+        token_cache.popitem(last=False)
+
+def extract_tokens(content: bytes, pages=(0,)):
+    """The whitespace-separated tokens of the given pages of a PDF"""
+    key = content_hash(content), tuple(pages)
+    if key not in token_cache:
+        from PyPDF2 import PdfFileReader
+        reader = PdfFileReader(BytesIO(content))
+        text = '\n'.join(reader.getPage(page).extractText() for page in pages)
+        remember(key, re.split(r'\s+', text))
+    return token_cache[key]
+
+def fetch_tokens(url: str, pages=(0,), timeout=10):
+    """The tokens of the PDF at url, or None if there isn't one (yet)"""
+    headers = {}
+    known = validators.get(url)
+    if known:
+        etag, last_modified, _ = known
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+    response = requests.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and known:
+        key = known[2], tuple(pages)
+        if key in token_cache:
+            return token_cache[key]
+        # unchanged, but its tokens aren't cached any more, so it's downloaded again
+        response = requests.get(url, timeout=timeout)
+
+    if response.status_code != 200:
+        return None
+
+    validators[url] = response.headers.get('ETag'), response.headers.get('Last-Modified'), content_hash(response.content)
+    return extract_tokens(response.content, pages)
@@ -1,5 +1,14 @@
 import standards
 import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+stat_labels = ['total', 'recovered', 'deaths', 'serious', 'hospitalized', 'tests']
+
+# batches at least this big are prepared a column at a time
+batch_threshold = 1000
 
 def number(string):
 
@@ -33,9 +42,6 @@ Data Preparation
 
 """
 def prepare_datapoint_data(datapoint_data):
-    import numpy as np
-    from datetime import datetime, date
-
     keys = set(datapoint_data.keys())
     for key in keys:
         if type(datapoint_data[key]) == float and np.isnan(datapoint_data[key]):
@@ -44,8 +50,9 @@ def prepare_datapoint_data(datapoint_data):
     defaultDate = datetime.utcnow().date()
     datapoint_data = {"country": "", "province": "", "county": "", "entry_date": defaultDate, **datapoint_data}
     datapoint_data['country'], datapoint_data['province'], datapoint_data['county'] = standards.normalize_name(datapoint_data['country'], datapoint_data['province'], datapoint_data['county'])
+    datapoint_data['group'] = standards.group_of(datapoint_data['country'])
 
-    for stat in ['total', 'recovered', 'deaths', 'serious', 'hospitalized', 'tests']:
+    for stat in stat_labels:
         if stat in datapoint_data:
             datapoint_data[stat] = number(datapoint_data[stat])
 
@@ -54,10 +61,9 @@ def prepare_datapoint_data(datapoint_data):
 def prepare_location_data(location_data):
     location_data = {"country": "", "province": "", "county": "", **location_data}
     location_data['country'], location_data['province'], location_data['county'] = standards.normalize_name(location_data['country'], location_data['province'], location_data['county'])
-    country_code = standards.country_codes_reverse.get(location_data['country'], '')
-    continent = standards.alpha2_to_continent.get(country_code, '')
-    if continent:
-        location_data['group'] = continent
+    group = standards.group_of(location_data['country'])
+    if group:
+        location_data['group'] = group
 
     return location_data
 
@@ -67,5 +73,100 @@ def is_total(string):
 def prepare_locations(locations):
     return [prepare_location_data(location_data) for location_data in locations if not is_total(location_data['country'])]
 
+"""
+
+Batch Preparation
+
+The same as prepare_datapoint_data, but a column at a time, for big batches
+like historical imports. Names and number strings repeat a lot, so each
+distinct one is only normalized or parsed once.
+
+"""
+def nan_mask(column):
+    """Which values are float NaN (missing keys come out of the DataFrame as NaN, too)"""
+    mask = pd.isna(column)
+    for i in np.flatnonzero(mask):
+        # None is kept, like in prepare_datapoint_data
+        mask[i] = type(column[i]) == float
+    return mask
+
+def map_distinct(func, column):
+    """func of each value in an object column, calling func once per distinct value"""
+    codes, uniques = pd.factorize(column, use_na_sentinel=False)
+    return np.array([func(value) for value in uniques], dtype=object)[codes]
+
+def parse_strings(strings):
+    """number() of each string, with the plain digit strings converted all at once"""
+    codes, uniques = pd.factorize(strings)
+    parsed = np.empty(len(uniques), dtype=object)
+
+    text = uniques.astype(str)
+    # up to 18 digits fits in an int64
+    plain = np.char.isdecimal(text) & (np.char.str_len(text) <= 18)
+    parsed[plain] = text[plain].astype(np.int64).tolist()
+    for i in np.flatnonzero(~plain):
+        parsed[i] = number(uniques[i])
+
+    return parsed[codes]
+
+def numbers(column):
+    """number() of each value"""
+    types = np.fromiter(map(type, column), dtype=object, count=len(column))
+    is_str = types == str
+    parsed = column.copy()
+    if is_str.any():
+        parsed[is_str] = parse_strings(column[is_str])
+    # ints, floats and None are kept as they are, and anything else is rejected by number()
+    for i in np.flatnonzero(~is_str & (types != int) & (types != float) & (types != type(None))):
+        parsed[i] = number(column[i])
+    return parsed
+
+def prepare_datapoints_batch(datapoints):
+    if not datapoints:
+        return []
+
+    df = pd.DataFrame(datapoints, dtype=object)
+    if 'country' not in df:
+        raise KeyError('country')
+    df = df[~map_distinct(is_total, df['country'].to_numpy()).astype(bool)]
+    count = len(df)
+    if count == 0:
+        return []
+
+    columns = {key: df[key].to_numpy(dtype=object, copy=True) for key in df.columns if key != 'group'}
+    present = {key: ~nan_mask(column) for key, column in columns.items()}
+
+    defaults = {"country": "", "province": "", "county": "", "entry_date": datetime.utcnow().date()}
+    for key, default in defaults.items():
+        if key not in columns:
+            columns[key] = np.full(count, default, dtype=object)
+        else:
+            columns[key][~present[key]] = default
+        present[key] = np.ones(count, dtype=bool)
+
+    names = np.fromiter(zip(columns['country'], columns['province'], columns['county']), dtype=object, count=count)
+    codes, uniques = pd.factorize(names)
+    normalized = [standards.normalize_name(*name) for name in uniques]
+    for i, label in enumerate(['country', 'province', 'county']):
+        columns[label] = np.array([name[i] for name in normalized], dtype=object)[codes]
+
+    columns['group'] = np.array([standards.group_of(name[0]) for name in normalized], dtype=object)[codes]
+    present['group'] = np.ones(count, dtype=bool)
+
+    for stat in stat_labels:
+        if stat in columns:
+            columns[stat][present[stat]] = numbers(columns[stat][present[stat]])
+
+    # the columns every row has become the dicts, and the rest are filled in where they're present
+    full = [key for key in columns if present[key].all()]
+    partial = [key for key in columns if key not in full]
+    rows = [dict(zip(full, values)) for values in zip(*[columns[key].tolist() for key in full])]
+    for key in partial:
+        for i in np.flatnonzero(present[key]):
+            rows[i][key] = columns[key][i]
+    return rows
+
 def prepare_datapoints(datapoints):
+    if len(datapoints) >= batch_threshold:
+        return prepare_datapoints_batch(datapoints)
     return [prepare_datapoint_data(datapoint_data) for datapoint_data in datapoints if not is_total(datapoint_data['country'])]
\ No newline at end of file
@@ -1,5 +1,6 @@
-from sqlalchemy import func
-from corona_sql import Datapoint
+from sqlalchemy import and_, func
+from corona_sql import location_index
+import partitioning
 
 """
 
@@ -8,26 +9,29 @@ Step 1. Find out all locations that need to be recounted (for all dates).
 Step 2. Sum up whatever needs to be summed up-- provinces, counties, etc.
 Step 3. Update the parent datapoint
 
-"""
-def filter_children(results, country, province, county):
-    if not country:
-        # sum entire world
-        return results.filter(Datapoint.country != '', Datapoint.province == '', Datapoint.county == '')
-    elif not province:
-        # sum entire country
-        return results.filter(Datapoint.country == country, Datapoint.province != '', Datapoint.county == '')
-    else:
-        # sum entire state
-        return results.filter(Datapoint.country == country, Datapoint.province == province, Datapoint.county != '')
+Children are found through the location index, so the sums only compare location_ids.
+A group (continent) is the sum of the countries in it, like the world is.
 
+"""
 stat_labels = ['total', 'deaths', 'recovered', 'serious', 'tests', 'hospitalized']
-sums = [func.sum(getattr(Datapoint, label)) for label in stat_labels]
 
-def sum_children(country, province, county, entry_date, session):
-    results = session.query(*sums).filter_by(entry_date=entry_date)
-    result = filter_children(results, country, province, county).first()
+def sum_children(location_id, entry_date, session):
+    children = location_index.children_of(location_id)
+    if not children:
+        return
+
+    # children in archived months (or intervals, if the database stores those) count too
+    history = partitioning.stored_select(['location_id', 'entry_date', *stat_labels], lambda table: and_(
+        table.c.entry_date == entry_date,
+        table.c.location_id.in_(list(children))
+    )).alias()
+    results = session.query(*[func.sum(history.c[label]) for label in stat_labels])
+    return overall_row(location_id, entry_date, results.first())
 
+def overall_row(location_id, entry_date, result):
     if any(result):
-        overall = {"country": country, "province": province, "county": county, "entry_date": entry_date}
+        country, province, county = location_index.names[location_id]
+        group = location_index.group_of(location_id)
+        overall = {"location_id": location_id, "country": country, "province": province, "county": county, "group": group, "entry_date": entry_date}
         overall.update({stat: aggregated for stat, aggregated in zip(stat_labels, result)})
         return overall
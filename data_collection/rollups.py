@@ -0,0 +1,119 @@
+"""
+Weekly and monthly rollups of each location's datapoints.
+
+Long-range charts can read one row per week or month instead of one per day.
+upload_datapoints passes in the (location_id, entry_date) pairs that changed,
+and only the periods containing those dates (or the week after them) are
+recalculated. Weeks start on Monday.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import and_
+
+from corona_sql import WeeklyRollup, MonthlyRollup, stat_labels
+import partitioning
+
+cumulative_labels = ['total', 'recovered', 'deaths', 'tests']
+
+# locations per query
+chunk_size = 500
+
+def to_date(d):
+    if type(d) == date:
+        return d
+    return datetime.strptime(d[:10], "%Y-%m-%d").date()
+
+def week_bounds(d: date):
+    start = d - timedelta(days=d.weekday())
+    return start, start + timedelta(days=6)
+
+def month_bounds(d: date):
+    start = d.replace(day=1)
+    next_month = (start + timedelta(days=32)).replace(day=1)
+    return start, next_month - timedelta(days=1)
+
+periods = [(WeeklyRollup, week_bounds), (MonthlyRollup, month_bounds)]
+
+def read_series(session, location_ids, start, end):
+    """Each location's (entry_date, stats) between start and end, in order"""
+    series = defaultdict(list)
+
+    history = partitioning.stored_select(['location_id', 'entry_date', *stat_labels], lambda table: and_(
+        table.c.location_id.in_(location_ids),
+        table.c.entry_date.between(start, end)
+    )).alias()
+    rows = session.query(history.c.location_id, history.c.entry_date, *[history.c[label] for label in stat_labels]).order_by(history.c.location_id, history.c.entry_date)
+
+    for location_id, entry_date, *stats in rows:
+        series[location_id].append((to_date(entry_date).isoformat(), dict(zip(stat_labels, stats))))
+
+    return series
+
+def daily_increases(days):
+    increases = {}
+    for (_, previous), (entry_date, current) in zip(days, days[1:]):
+        increases[entry_date] = {label: (current[label] or 0) - (previous[label] or 0) for label in cumulative_labels}
+    return increases
+
+def summarize(rollup, days, period_start, period_end):
+    """Fills in a rollup from the days of its period (plus the days before it, for the increases). False if the period has no days"""
+    in_period = [(entry_date, stats) for entry_date, stats in days if period_start <= entry_date <= period_end]
+    if not in_period:
+        return False
+
+    last_date, last = in_period[-1]
+    week_start = (to_date(last_date) - timedelta(days=6)).isoformat()
+    increases = daily_increases(days)
+
+    rollup.period_end = period_end
+    rollup.last_date = last_date
+    rollup.update_time = datetime.utcnow()
+
+    for label in stat_labels:
+        setattr(rollup, label, last[label] or 0)
+
+    for label in cumulative_labels:
+        period_increases = [increase[label] for entry_date, increase in increases.items() if period_start <= entry_date <= period_end]
+        week_increases = [increase[label] for entry_date, increase in increases.items() if week_start <= entry_date <= last_date]
+        setattr(rollup, 'd' + label, sum(period_increases))
+        setattr(rollup, 'avg_d' + label, sum(week_increases) / 7)
+
+    return True
+
+def update_rollups(session, changed):
+    if not changed:
+        return
+
+    # location_id -> the (start, end) of every period with a changed date. A date's stats
+    # are also part of the next day's increase, which is in the 7-day averages of the week after it
+    dirty = {rollup_class: defaultdict(set) for rollup_class, _ in periods}
+    for location_id, entry_date in changed:
+        changed_date = to_date(entry_date)
+        for rollup_class, bounds in periods:
+            for days_after in range(8):
+                dirty[rollup_class][location_id].add(bounds(changed_date + timedelta(days=days_after)))
+
+    location_ids = sorted({location_id for location_id, _ in changed})
+    for i in range(0, len(location_ids), chunk_size):
+        chunk = location_ids[i:i + chunk_size]
+
+        chunk_periods = [period for rollup_class, _ in periods for location_id in chunk for period in dirty[rollup_class][location_id]]
+        first_day = min(start for start, _ in chunk_periods) - timedelta(days=7)
+        last_day = max(end for _, end in chunk_periods)
+        series = read_series(session, chunk, first_day.isoformat(), last_day.isoformat())
+
+        for rollup_class, _ in periods:
+            starts = {start.isoformat() for location_id in chunk for start, _ in dirty[rollup_class][location_id]}
+            existing = session.query(rollup_class).filter(rollup_class.location_id.in_(chunk), rollup_class.period_start.in_(list(starts)))
+            rollups = {(rollup.location_id, rollup.period_start): rollup for rollup in existing}
+
+            for location_id in chunk:
+                for start, end in dirty[rollup_class][location_id]:
+                    key = location_id, start.isoformat()
+                    rollup = rollups.get(key) or rollup_class(location_id=location_id, period_start=start.isoformat())
+
+                    # periods after the changed date may not have any days yet
+                    if summarize(rollup, series[location_id], start.isoformat(), end.isoformat()) and key not in rollups:
+                        session.add(rollup)
@@ -0,0 +1,44 @@
+"""
+A fixed latitude/longitude grid, used to find points near a location
+without scanning every row. Each point is stored with the integer id of
+the grid cell it's in, so a radius search becomes an indexed lookup of
+a few cells followed by an exact distance check.
+"""
+
+import math
+
+cell_degrees = 0.5
+earth_radius_km = 6371.0
+km_per_degree = 111.32
+
+# 360 / cell_degrees columns around the globe
+grid_columns = int(360 / cell_degrees)
+
+def cell_of(latitude, longitude):
+    latitude, longitude = float(latitude), float(longitude)
+    row = math.floor((latitude + 90) / cell_degrees)
+    column = math.floor((longitude + 180) / cell_degrees) % grid_columns
+    return row * grid_columns + column
+
+def cells_within(latitude, longitude, radius_km):
+    """All of the grid cells that contain points within radius_km"""
+    latitude, longitude = float(latitude), float(longitude)
+    lat_delta = radius_km / km_per_degree
+    lng_delta = radius_km / (km_per_degree * max(math.cos(math.radians(latitude)), 0.01))
+    lng_delta = min(lng_delta, 180)
+
+    min_row = math.floor((max(latitude - lat_delta, -90) + 90) / cell_degrees)
+    max_row = math.floor((min(latitude + lat_delta, 90) + 90) / cell_degrees)
+    min_column = math.floor((longitude - lng_delta + 180) / cell_degrees)
+    max_column = math.floor((longitude + lng_delta + 180) / cell_degrees)
+
+    cells = set()
+    for row in range(min_row, max_row + 1):
+        for column in range(min_column, max_column + 1):
+            cells.add(row * grid_columns + column % grid_columns)
+    return cells
+
+def distance_km(lat_1, lng_1, lat_2, lng_2):
+    lat_1, lng_1, lat_2, lng_2 = (math.radians(float(degrees)) for degrees in (lat_1, lng_1, lat_2, lng_2))
+    a = math.sin((lat_2 - lat_1) / 2) ** 2 + math.cos(lat_1) * math.cos(lat_2) * math.sin((lng_2 - lng_1) / 2) ** 2
+    return 2 * earth_radius_km * math.asin(math.sqrt(a))
@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+import functools
 import json
 
 def switch_keys(myDict):
@@ -27,6 +28,30 @@ def remove_end(string, end):
 
 import string
 import re
+
+def compile_aliases(table):
+	"""
+	The aliases of one level, compiled once, and one combined pattern that matches
+	wherever any of them would. Names that the combined pattern doesn't match
+	(most of them) skip the aliases entirely.
+	"""
+	patterns = [(re.compile(regex, flags=re.IGNORECASE), actual) for regex, actual in table.items()]
+	combined = re.compile("|".join(f"(?:{regex})" for regex in table), flags=re.IGNORECASE) if table else None
+	return combined, patterns
+
+compiled_aliases = {level: compile_aliases(table) for level, table in aliases.items()}
+
+def apply_aliases(name, level):
+	combined, patterns = compiled_aliases[level]
+	if combined is None or not combined.search(name):
+		return name
+	# aliases are applied in order, so one alias can match the output of another
+	for pattern, actual in patterns:
+		name = pattern.sub(actual, name)
+	return name
+
+# the same few thousand names are normalized over and over
+@functools.lru_cache(maxsize=16384)
 def normalize_name(country: str, province: str = '', county: str = ''):
 	country = country.strip()
 	province = province.strip()
@@ -42,14 +67,9 @@ def normalize_name(country: str, province: str = '', county: str = ''):
 	if ", " in province and county == '':
 		county, province_id = province.split(", ")
 
-	for regex, actual in aliases['country'].items():
-		country = re.sub(regex, actual, country, flags=re.IGNORECASE)
-
-	for regex, actual in aliases['province'].items():
-		province = re.sub(regex, actual, province, flags=re.IGNORECASE)
-	
-	for regex, actual in aliases['county'].items():
-		county = re.sub(regex, actual, county, flags=re.IGNORECASE)
+	country = apply_aliases(country, 'country')
+	province = apply_aliases(province, 'province')
+	county = apply_aliases(county, 'county')
 
 	# idk why this would happen but just to be safe
 	county = county.replace("U.S.", "US")
@@ -79,6 +99,11 @@ continent_codes = {
 	"AN": "Antarctica"
 }
 
+def group_of(country):
+	"""The named group (a continent) whose totals a country is counted in, or '' if there isn't one"""
+	country_code = country_codes_reverse.get(country, '')
+	return continent_codes.get(alpha2_to_continent.get(country_code, ''), '')
+
 if __name__ == "__main__":
 	print(normalize_name("US", "NY", "New York City"))
 	print(normalize_name("US", "NY", "Orange County"))
\ No newline at end of file
@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# the collector is run from data_collection (standards.py reads ./location_data)
+collector_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(collector_dir)
+sys.path.insert(0, collector_dir)
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'corona.db'))
+
+@pytest.fixture
+def db():
+    """A fresh database, and a location index that doesn't remember the last one"""
+    import corona_sql
+
+    corona_sql.Base.metadata.drop_all(corona_sql.engine)
+    corona_sql.Base.metadata.create_all(corona_sql.engine)
+    corona_sql.location_index.__init__()
+    yield corona_sql.engine
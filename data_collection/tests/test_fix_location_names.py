@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'misc', 'fix'))
+
+def test_merging_two_locations_into_one(db):
+    from corona_sql import Session, Location, Datapoint, Mobility, DatapointInterval
+    import fix_location_names
+
+    session = Session()
+    for location_id, country in [(1, 'South Korea'), (2, 'Korea, South'), (3, 'Republic of South Korea')]:
+        session.add(Location(location_id=location_id, country=country))
+    session.flush()
+
+    # both of the merged locations have 2020-05-01, and the target doesn't
+    for location_id, country, entry_date, total, deaths in [
+        (2, 'Korea, South', '2020-05-01', 5, 2),
+        (3, 'Republic of South Korea', '2020-05-01', 8, 1),
+        (3, 'Republic of South Korea', '2020-05-02', 9, 1),
+    ]:
+        session.add(Datapoint({'location_id': location_id, 'country': country, 'entry_date': entry_date, 'total': total, 'deaths': deaths}))
+    for location_id in [2, 3]:
+        session.add(Mobility(location_id=location_id, entry_date='2020-05-01', transit_change=-10.0 * location_id))
+        session.add(DatapointInterval(location_id=location_id, valid_from='2020-05-01', valid_to='2020-05-03', total=location_id))
+    session.commit()
+
+    fix_location_names.fix_location_names()
+
+    session = Session()
+    assert [location.country for location in session.query(Location)] == ['South Korea']
+
+    datapoints = session.query(Datapoint).order_by(Datapoint.entry_date).all()
+    assert [(d.location_id, d.entry_date, d.total, d.deaths, d.group) for d in datapoints] == [
+        (1, '2020-05-01', 8, 2, 'Asia'),
+        (1, '2020-05-02', 9, 1, 'Asia'),
+    ]
+    assert [m.location_id for m in session.query(Mobility)] == [1]
+    assert [(i.location_id, i.valid_from) for i in session.query(DatapointInterval)] == [(1, '2020-05-01')]
+    session.close()
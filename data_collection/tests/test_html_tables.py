@@ -0,0 +1,44 @@
+import math
+
+import html_tables
+
+no_thead = """
+<html><body><table id="cases">
+    <tr><th>Province</th><th>Cases</th></tr>
+    <tr><td>Lazio</td><td>1,200</td></tr>
+    <tr><td>Veneto</td><td>_</td></tr>
+</table></body></html>
+"""
+
+with_thead = """
+<html><body><table id="cases">
+    <thead><tr><th>Province</th><th>Cases</th></tr></thead>
+    <tbody>
+        <tr><th>1</th><td>Lazio</td><td>1,200</td></tr>
+        <tr data-total="1"><th>2</th><td>Total</td><td>1,200</td></tr>
+    </tbody>
+</table></body></html>
+"""
+
+def test_table_without_thead():
+    import data_parser
+
+    df = data_parser.table_df(html_tables.find_table(no_thead, id="cases"))
+
+    # the first row is the header, and not also a data row
+    assert list(df.columns) == ["Province", "Cases"]
+    assert list(df["Province"]) == ["Lazio", "Veneto"]
+    assert df["Cases"][0] == 1200
+    assert math.isnan(df["Cases"][1])
+
+def test_table_rows_are_body_data_cells():
+    rows = html_tables.extract_table(with_thead, id="cases")
+
+    assert [row.cells for row in rows] == [["Lazio", "1,200"], ["Total", "1,200"]]
+    assert rows[1].attrs == {"data-total": "1"}
+
+    rows = html_tables.extract_table(with_thead, cells=html_tables.all_cells, id="cases")
+    assert rows[0].cells == ["1", "Lazio", "1,200"]
+
+    # without a tbody, there are no body rows to read
+    assert html_tables.extract_table(no_thead, id="cases") == []
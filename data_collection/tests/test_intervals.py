@@ -0,0 +1,63 @@
+import pytest
+from sqlalchemy import text
+
+@pytest.fixture
+def interval_db(db, monkeypatch):
+    """A database that stores intervals, with the datapoints views over them"""
+    import corona_sql
+    import partitioning
+
+    monkeypatch.setattr(corona_sql, 'interval_storage', True)
+    partitioning.create_history_view(db)
+    yield db
+
+def upload_totals(rows):
+    import upload
+    upload.upload_datapoints([
+        {'country': 'Italy', 'province': province, 'entry_date': entry_date, 'total': total}
+        for province, entry_date, total in rows
+    ])
+
+def view_totals(engine, country, province=''):
+    with engine.connect() as conn:
+        return dict(conn.execute(text(
+            "select entry_date, total from datapoints where country = :country and province = :province and county = '' order by entry_date"
+        ), country=country, province=province).fetchall())
+
+def test_datapoints_view_has_a_row_per_day(interval_db):
+    from corona_sql import Session, DatapointInterval
+
+    upload_totals([
+        ('Lazio', '2020-05-01', 10),
+        ('Lazio', '2020-05-02', 10),
+        ('Lazio', '2020-05-03', 10),
+        ('Lazio', '2020-05-04', 15),
+        ('Veneto', '2020-05-02', 5),
+        ('Veneto', '2020-05-03', 7),
+    ])
+
+    session = Session()
+    assert session.query(DatapointInterval).count() > 0
+    session.close()
+
+    assert view_totals(interval_db, 'Italy', 'Lazio') == {'2020-05-01': 10, '2020-05-02': 10, '2020-05-03': 10, '2020-05-04': 15}
+    # the country is recounted from the provinces' intervals
+    assert view_totals(interval_db, 'Italy') == {'2020-05-01': 10, '2020-05-02': 15, '2020-05-03': 17, '2020-05-04': 15}
+
+def test_rollups_read_intervals(interval_db):
+    from corona_sql import Session, WeeklyRollup, location_index
+
+    upload_totals([('Lazio', '2020-05-0' + str(day), 10 * day) for day in range(4, 8)])
+
+    session = Session()
+    location_id = location_index.get_id(session, 'Italy', 'Lazio')
+    rollup = session.query(WeeklyRollup).filter_by(location_id=location_id, period_start='2020-05-04').one()
+    assert (rollup.last_date, rollup.total, rollup.dtotal) == ('2020-05-07', 70, 30)
+    session.close()
+
+def test_extending_an_interval_back_then_splitting_it(interval_db):
+    upload_totals([('Lazio', '2020-05-03', 5)])
+    # 05-02 moves the start of the 05-03 interval back, and then 05-03 splits it again
+    upload_totals([('Lazio', '2020-05-02', 5), ('Lazio', '2020-05-03', 7)])
+
+    assert view_totals(interval_db, 'Italy', 'Lazio') == {'2020-05-02': 5, '2020-05-03': 7}
@@ -0,0 +1,40 @@
+from datetime import date, timedelta
+
+def upload_totals(totals):
+    import upload
+    upload.upload_datapoints([
+        {'country': 'Italy', 'entry_date': entry_date, 'total': total}
+        for entry_date, total in totals.items()
+    ])
+
+def weekly_rollup(period_start):
+    from corona_sql import Session, WeeklyRollup, location_index
+    session = Session()
+    location_id = location_index.get_id(session, 'Italy')
+    rollup = session.query(WeeklyRollup).filter_by(location_id=location_id, period_start=period_start).one()
+    session.close()
+    return rollup
+
+def test_change_on_last_day_of_week_updates_next_week(db):
+    # Monday 2020-05-04 through Tuesday 2020-05-12, 10 more cases each day
+    first = date(2020, 5, 4)
+    upload_totals({(first + timedelta(days=i)).isoformat(): 40 + 10 * i for i in range(9)})
+    assert weekly_rollup('2020-05-11').dtotal == 20
+
+    # the Sunday before the week changes, so Monday's increase is smaller
+    upload_totals({'2020-05-10': 105})
+
+    assert weekly_rollup('2020-05-04').total == 105
+    next_week = weekly_rollup('2020-05-11')
+    assert next_week.dtotal == 15
+    # 2020-05-06 through 2020-05-12
+    assert next_week.avg_dtotal == (10 + 10 + 10 + 10 + 15 + 5 + 10) / 7
+
+def test_later_periods_without_days_are_not_created(db):
+    from corona_sql import Session, WeeklyRollup, location_index
+    upload_totals({'2020-05-10': 100})
+
+    session = Session()
+    location_id = location_index.get_id(session, 'Italy')
+    assert [rollup.period_start for rollup in session.query(WeeklyRollup).filter_by(location_id=location_id)] == ['2020-05-04']
+    session.close()
@@ -1,8 +1,12 @@
-from corona_sql import Session, Datapoint, Location, try_commit
+import corona_sql
+from corona_sql import Session, Datapoint, Location, location_index, try_commit
 from sqlalchemy import or_, between, func
 from datetime import date
 from caching import DatapointCache, LocationCache
+from intervals import IntervalCache
 import prepare_data
+import rollups
+import freshness
 import typing
 import inspect
 
@@ -25,7 +29,7 @@ import inspect
 #         print("\rCommitting locations             ", end='\r')
 #     try_commit(session)
 
-def upload_datapoints(datapoints: typing.List, verbose: bool = False, force_update: bool = False) -> bool:
+def upload_datapoints(datapoints: typing.List, verbose: bool = False, force_update: bool = False, source: str = None) -> bool:
     if inspect.isgenerator(datapoints):
         datapoints = list(datapoints)
 
@@ -43,11 +47,15 @@ def upload_datapoints(datapoints: typing.List, verbose: bool = False, force_upda
         print("\rPreparing datapoints", end=end)
 
     datapoints = prepare_data.prepare_datapoints(datapoints)
+    location_index.assign_ids(datapoints, session)
     
     if verbose:
         print("\rCreating datapoints cache", end=end)
 
-    cache = DatapointCache.create(datapoints, session)
+    if corona_sql.interval_storage:
+        cache = IntervalCache.create(datapoints, session)
+    else:
+        cache = DatapointCache.create(datapoints, session)
     cache.force_update = force_update
 
     if verbose:
@@ -65,6 +73,15 @@ def upload_datapoints(datapoints: typing.List, verbose: bool = False, force_upda
         
     cache.recount_changes()
 
+    if verbose:
+        print("\rUpdating rollups", end=end)
+
+    rollups.update_rollups(session, cache.changed)
+
+    reported = {row['location_id'] for row in datapoints}
+    changed = {location_id for location_id, _ in cache.changed}
+    freshness.update_freshness(session, reported, changed, source)
+
     if verbose:
         print("\rCommitting", end=end)
 
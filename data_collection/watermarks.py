@@ -0,0 +1,57 @@
+"""
+High-water marks for sources that publish their whole history every time.
+
+Each incremental source has a row in source_watermarks with the latest
+entry_date it has fully imported. The next import only asks for (and
+uploads) the dates from revision_days before the watermark onwards, so
+recent revisions are still picked up, but the rest of the history isn't
+read, cached and compared again.
+"""
+
+from datetime import date, datetime, timedelta
+
+from corona_sql import Session, SourceWatermark, try_commit
+
+# days before the watermark that are imported again, in case they were revised
+revision_days = 3
+
+def iso(d):
+    if type(d) in (date, datetime):
+        return d.isoformat()[:10]
+    return str(d)[:10]
+
+def get_watermark(source):
+    session = Session()
+    try:
+        watermark = session.query(SourceWatermark).get(source)
+        return watermark.entry_date if watermark else None
+    finally:
+        session.close()
+
+def start_date(source, days=revision_days):
+    """The first date an import of source needs, or None if it has never been imported"""
+    watermark = get_watermark(source)
+    if watermark is None:
+        return None
+    return (datetime.strptime(watermark, "%Y-%m-%d").date() - timedelta(days=days)).isoformat()
+
+def since(datapoints, start_date):
+    """The datapoints from start_date on. Datapoints without an entry_date are for today, so they're kept."""
+    return [datapoint for datapoint in datapoints if 'entry_date' not in datapoint or iso(datapoint['entry_date']) >= start_date]
+
+def advance(source, datapoints):
+    """Moves the watermark up to the latest date in datapoints, which have been uploaded"""
+    dates = [iso(datapoint['entry_date']) for datapoint in datapoints if datapoint.get('entry_date')]
+    if not dates:
+        return
+
+    session = Session()
+    watermark = session.query(SourceWatermark).get(source)
+    if watermark is None:
+        watermark = SourceWatermark(source=source)
+        session.add(watermark)
+
+    if watermark.entry_date is None or max(dates) > watermark.entry_date:
+        watermark.entry_date = max(dates)
+
+    try_commit(session)
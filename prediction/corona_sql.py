@@ -1,5 +1,5 @@
 from sqlalchemy import and_, between, not_
-from sqlalchemy import create_engine, Column, Integer, Float, Boolean, String, DateTime, Enum, Date, JSON
+from sqlalchemy import create_engine, Column, Integer, Float, Boolean, String, DateTime, Enum, Date, JSON, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.sql import func
@@ -13,18 +13,67 @@ import time
 sql_uri = os.environ['DATABASE_URL']
 engine = create_engine(sql_uri)
 
+# Read-only work can go to a replica. Without one, it goes to the primary
+read_sql_uri = os.environ.get('DATABASE_READ_URL')
+read_engine = create_engine(read_sql_uri) if read_sql_uri else engine
+
+# Replicas that are further behind than this (in seconds) aren't read from
+max_replica_lag = int(os.environ.get('DATABASE_MAX_REPLICA_LAG', '60'))
+
 # Scoped_session is important here
 Session = scoped_session(sessionmaker(bind=engine, autocommit=False))
+ReadSession = scoped_session(sessionmaker(bind=read_engine, autocommit=False))
+
+_replica_lag = None
+_replica_lag_checked = 0
+
+def replica_lag():
+	"""Seconds that the replica is behind the primary, or None if it can't be measured"""
+	global _replica_lag, _replica_lag_checked
+
+	if read_engine is engine:
+		return 0
+
+	# only check every few seconds, so this isn't a query per read
+	if time.time() - _replica_lag_checked > 10:
+		_replica_lag_checked = time.time()
+		try:
+			with read_engine.connect() as conn:
+				status = conn.execute("SHOW SLAVE STATUS").first()
+			_replica_lag = status['Seconds_Behind_Master'] if status else None
+		except Exception:
+			_replica_lag = None
+
+	return _replica_lag
+
+def use_replica(fresh=False):
+	"""Whether reads can go to the replica: it's caught up, and its lag could be measured"""
+	if fresh:
+		return False
+
+	lag = replica_lag()
+	return lag is not None and lag <= max_replica_lag
+
+def read_session(fresh=False):
+	"""A session for read-only work. Pass fresh=True if the data has to be up to date with the last write"""
+	return ReadSession() if use_replica(fresh) else Session()
 
 # Class used to make tables
 Base = declarative_base()
 
 class Location(Base):
 	__tablename__ = "locations"
+	__table_args__ = (UniqueConstraint('country', 'province', 'county', 'group', name='location_names'),)
 
-	country = Column(String(256), primary_key=True)
-	province = Column(String(256), primary_key=True)
-	county = Column(String(256), primary_key=True)
+	location_id = Column(Integer, primary_key=True)
+
+	country = Column(String(256), default='')
+	province = Column(String(256), default='')
+	county = Column(String(256), default='')
+	group = Column(String(320), default='')
+
+	country_code = Column(String(2), index=True)
+	fips = Column(String(5), unique=True)
 
 	latitude = Column(Float(10, 6))
 	longitude = Column(Float(10, 6))
@@ -32,6 +81,7 @@ class Location(Base):
 	latitude = Column(Float(10, 6))
 	longitude = Column(Float(10, 6))
 
+	# thousands of people, and thousands of people per km²
 	population = Column(Float)
 	population_density = Column(Float)
 
@@ -60,14 +110,17 @@ class Datapoint(Base):
 	# DEBUG MARKER
 	__tablename__ = "datapoints"
 
+	# locations.location_id
+	location_id = Column(Integer, primary_key=True, autoincrement=False)
+
 	# columns about the date/time of the datapoint
 	entry_date = Column(String(16), primary_key=True)
 	update_time = Column(DateTime, default=datetime.utcnow())
 	
 	# columns about the nominal location
-	county = Column(String(320), default='', primary_key=True)
-	province = Column(String(320), default='', primary_key=True)
-	country = Column(String(320), default='', primary_key=True)
+	county = Column(String(320), default='')
+	province = Column(String(320), default='')
+	country = Column(String(320), default='')
 	group = Column(String(320), default='')
 	
 	# COVID-19 stats about this datapoint
@@ -78,8 +131,23 @@ class Datapoint(Base):
 	tests = Column(Integer, default=0)
 	hospitalized = Column(Integer, default=0)
 
-def time_series(country, province, county):
-	session = Session()
+class Mobility(Base):
+	# Filled in by data_collection/data_imports/import_mobility.py
+	__tablename__ = "mobility"
+
+	location_id = Column(Integer, primary_key=True, autoincrement=False)
+	entry_date = Column(String(16), primary_key=True)
+
+	# percent change from the baseline
+	retail_change = Column(Float)
+	grocery_change = Column(Float)
+	parks_change = Column(Float)
+	transit_change = Column(Float)
+	workplaces_change = Column(Float)
+	residential_change = Column(Float)
+
+def time_series(country, province, county, fresh=False):
+	session = read_session(fresh)
 	rows = session.query(Datapoint).filter_by(country=country, province=province, county=county).order_by(Datapoint.entry_date).all()
 	session.close()
 	X = []
@@ -107,9 +175,14 @@ def time_series(country, province, county):
 	
 	return X, Y
 
-def timeSeriesAll(country, province, county):
-	session = Session()
-	rows = session.query(Datapoint).filter_by(country=country, province=province, county=county).order_by(Datapoint.entry_date).all()
+def timeSeriesAll(country, province, county, fresh=False):
+	"""Datapoints for every day, with each day's transit_change (None when there's no mobility data) joined on"""
+	session = read_session(fresh)
+	query = session.query(Datapoint, Mobility.transit_change).outerjoin(Mobility, and_(Mobility.location_id == Datapoint.location_id, Mobility.entry_date == Datapoint.entry_date))
+	rows = []
+	for row, transit_change in query.filter(Datapoint.country == country, Datapoint.province == province, Datapoint.county == county).order_by(Datapoint.entry_date):
+		row.transit_change = transit_change
+		rows.append(row)
 	session.close()
 	X = []
 	Y = []
@@ -136,8 +209,8 @@ def timeSeriesAll(country, province, county):
 	
 	return X, Y
 
-def getLocationObject(country, province, county):
-	session = Session()
-	result = session.query(Location).filter_by(country=country, province=province, county=county).first()
+def getLocationObject(country, province, county, fresh=False):
+	session = read_session(fresh)
+	result = session.query(Location).filter_by(country=country, province=province, county=county, group='').first()
 	session.close()
 	return result
\ No newline at end of file
@@ -7,7 +7,7 @@ import makeCSV
 import better_predictor
 import numpy as np
 from matplotlib import pyplot as plt
-from corona_sql import Location, Session
+from corona_sql import Location, read_session
 
 # data = makeCSV.timeSeriesDF("United States", "", "")
 # results = better_predictor.predict_better(data['day%'], 5)
@@ -39,7 +39,7 @@ class LockdownTrainer:
     
     def addCountryData(self, country, province, county):
         data = makeCSV.timeSeriesDF(country, province, county)
-        if len(data) < 28:
+        if data is None or len(data) < 28:
             return
         X, Y = makeCSV.getFrames(data)
         if self.X is None:
@@ -71,7 +71,7 @@ class LockdownTrainer:
             print(self.Yscaler.inverse_transform([actual]), self.Yscaler.inverse_transform([pred]))
 
 ldt = LockdownTrainer()
-sess = Session()
+sess = read_session()
 locations = sess.query(Location.country, Location.province, Location.county).filter(
     Location.population != None,
     Location.population_density != None).all()
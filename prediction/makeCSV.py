@@ -18,13 +18,12 @@ def timeSeriesDF(country, province, county):
     population = locationObject.population
     populationDensity = locationObject.population_density
 
-    if not population:
-        population = float(input("Couldn't find {} {} {} population data. What is it, in millions of people? ".format(country, province, county)))
-    else:
-        population /= 1000
+    # these are filled in by data_collection/data_imports/import_population.py
+    if not population or not populationDensity:
+        sys.stderr.write("[{}, {}, {}] Missing population data, skipping. Run import_population first\n".format(country, province, county))
+        return None
 
-    if not populationDensity:
-        populationDensity = float(input("Couldn't find {} {} {} population density. What is it, in thousands of people/km^2? ".format(country, province, county)))
+    population /= 1000
 
     dailyPercentage = dfColumn(Y, "dtotal") / dfColumn(Y, "total") + 1
 
@@ -34,7 +33,8 @@ def timeSeriesDF(country, province, county):
         "cases/mil/day": dfColumn(Y, "dtotal") / population,
         "day%": dailyPercentage,
         "popdensity": np.full((len(X),), populationDensity),
-        "transit_change": dfColumn(Y, "transit_change")
+        # NaN on days without mobility data
+        "transit_change": dfColumn(Y, "transit_change").astype(float)
     }
 
     df = pd.DataFrame(data)
@@ -50,7 +50,8 @@ def last3Weeks(series, index):
 
 def getFrame(df, index):
     weekAgo3, weekAgo2, weekAgo, weekLater = last3Weeks(df['cases/mil/day'], index)
-    transit3, transit2, transit1, _ = last3Weeks(df['transit_change'], index)
+    # days without mobility data count as the baseline
+    transit3, transit2, transit1, _ = last3Weeks(df['transit_change'].fillna(0), index)
 
     x = np.array([weekAgo3, weekAgo2, weekAgo, transit3, transit2, transit1, index, df['popdensity'][index]])
     y = np.array([weekLater])
@@ -45,10 +45,8 @@ select
     today.tests - yesterday.tests as dtests
 from datapoints today
 left join datapoints yesterday on 
-    date(yesterday.entry_date) = date(today.entry_date - interval 1 day) and
-    yesterday.country=today.country and
-    yesterday.province=today.province and
-    yesterday.county=today.county
+    yesterday.location_id = today.location_id and
+    yesterday.entry_date = date_format(date(today.entry_date) - interval 1 day, '%Y-%m-%d')
 `;
 
 function where(country: string = '', province: string = '', county: string = '', type: 'children' | 'exact' | 'childRequired' = 'exact') {
@@ -160,15 +158,11 @@ function getHeatmap(entryDate: string): Promise<Datapoint[]> {
             FROM datapoints today
             INNER JOIN locations loc
             ON
-                loc.country=today.country AND
-                loc.province=today.province AND
-                loc.county=today.county
+                loc.location_id=today.location_id
             LEFT JOIN datapoints yesterday
             ON
-                yesterday.country=today.country AND
-                yesterday.province=today.province AND
-                yesterday.county=today.county AND
-                date(yesterday.entry_date)=date(today.entry_date - interval 1 day)
+                yesterday.location_id=today.location_id AND
+                yesterday.entry_date=date_format(date(today.entry_date) - interval 1 day, '%Y-%m-%d')
             WHERE
                 today.entry_date = ? and
                 loc.latitude is not null